@@ -2,555 +2,2082 @@
 
 # https://docs.openshift.com/container-platform/4.8/rest_api/index.html
 
+import io
 import os
 import re
 import csv
 import sys
 import html
 import json
+import struct
+import dataclasses
 import logging
-import datetime
+import time
+import contextlib
 import argparse
-import openpyxl
-import subprocess
+import operator
+import functools
 
-url_prefix = 'https://docs.openshift.com/container-platform'
-ocp_version = ''
+__version__ = '1.0'
 
+url_prefix = 'https://docs.openshift.com/container-platform'
+logger = logging.getLogger('xxx')
+tracing = False # set by enable_trace(); checked before building trace records
+
+def enable_trace():
+    global tracing
+    tracing = True
+    logger.setLevel(logging.INFO)
+
+def trace_default(o):
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    return str(o)
+
+# Logs a structured trace record as one JSON line. Callers on the parse hot
+# path guard it with "if tracing:", so nothing is built when it's disabled.
+def trace(event, **fields):
+    logger.info(json.dumps(dict(event=event, **fields), default=trace_default))
+
+profile_stages = ['read', 'tokenize', 'parse', 'model', 'metadata', 'render', 'serialize', 'save']
+profiler = None # set by enable_profile()
+
+def enable_profile(memory=False):
+    global profiler
+    profiler = Profiler(memory)
+    if memory:
+        profiler.tracemalloc.start()
+
+# Wall time, CPU time and, with memory, memory allocated (net and peak, with
+# tracemalloc, which slows everything down several times) of each stage of
+# each page, and counts of what the stage produced. Stages may nest, and the
+# time of a nested stage is not counted in the outer one.
+class Profiler:
+    def __init__(self, memory=False):
+        self.memory = memory
+        if memory:
+            import tracemalloc
+            self.tracemalloc = tracemalloc
+        self.pages = []
+        self.stages = None
+        self.stack = []
+
+    def page(self, name):
+        self.stages = {}
+        self.pages.append({'page': name, 'stages': self.stages})
+
+    def start(self, frame):
+        frame[1] = time.perf_counter()
+        frame[2] = time.process_time()
+        if self.memory:
+            frame[3] = self.tracemalloc.get_traced_memory()[0]
+            self.tracemalloc.reset_peak()
+
+    def stop(self, frame):
+        entry = frame[0]
+        entry['wall'] += time.perf_counter() - frame[1]
+        entry['cpu'] += time.process_time() - frame[2]
+        if self.memory:
+            current, peak = self.tracemalloc.get_traced_memory()
+            entry['allocated'] += current - frame[3]
+            entry['peak'] = max(entry['peak'], peak - frame[3])
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'wall': 0.0, 'cpu': 0.0, 'allocated': 0, 'peak': 0} if self.memory else {'wall': 0.0, 'cpu': 0.0}
+        if self.stack:
+            self.stop(self.stack[-1])
+        frame = [entry, 0, 0, 0]
+        self.stack.append(frame)
+        self.start(frame)
+        try:
+            yield entry
+        finally:
+            self.stop(frame)
+            self.stack.pop()
+            if self.stack:
+                self.start(self.stack[-1])
+
+    def count(self, name, **counts):
+        entry = self.stages[name]
+        for key, n in counts.items():
+            entry[key] = entry.get(key, 0) + n
+
+    def totals(self):
+        totals = {}
+        for page in self.pages:
+            for name, entry in page['stages'].items():
+                total = totals.setdefault(name, {})
+                for key, value in entry.items():
+                    total[key] = max(total.get(key, 0), value) if key == 'peak' else total.get(key, 0) + value
+        return {name: totals[name] for name in profile_stages + sorted(totals) if name in totals}
+
+    def to_dict(self):
+        return {'pages': self.pages, 'total': self.totals()}
+
+    def report(self, file):
+        totals = self.totals()
+        memory = '{:>11} {:>11} '.format('alloc (KiB)', 'peak (KiB)') if self.memory else ''
+        print('{:10} {:>9} {:>9} {} {}'.format('stage', 'wall (s)', 'cpu (s)', memory, 'counts'), file=file)
+        for name, entry in totals.items():
+            memory = '{:11.0f} {:11.0f} '.format(entry['allocated'] / 1024, entry['peak'] / 1024) if self.memory else ''
+            counts = ', '.join('{} {}'.format(k, v) for k, v in entry.items() if k not in ['wall', 'cpu', 'allocated', 'peak'])
+            print('{:10} {:9.3f} {:9.3f} {} {}'.format(name, entry['wall'], entry['cpu'], memory, counts), file=file)
+        if len(self.pages) > 1:
+            print('{} pages, slowest:'.format(len(self.pages)), file=file)
+            pages = sorted(self.pages, key=lambda page: -sum(entry['wall'] for entry in page['stages'].values()))
+            for page in pages[:10]:
+                print('{:9.3f}  {}'.format(sum(entry['wall'] for entry in page['stages'].values()), page['page']), file=file)
+
+def profile_stage(name):
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+@dataclasses.dataclass(slots=True)
+class Parameter:
+    name: str
+    type: str
+    description: str = ''
+    hyperlink: str = None
+
+    def to_dict(self, linked=True):
+        return {
+            'Parameter': self.name,
+            'Type': {'value': self.type, 'hyperlink': self.hyperlink} if linked else self.type,
+            'Description': self.description,
+        }
+
+@dataclasses.dataclass(slots=True)
+class Response:
+    code: str
+    body: str
+    hyperlink: str = None
+
+    def to_dict(self):
+        return {'HTTP code': self.code, 'Response body': {'value': self.body, 'hyperlink': self.hyperlink}}
+
+@dataclasses.dataclass(slots=True)
+class Method:
+    method: str
+    description: str = None
+    query_parameters: list = None
+    body_parameters: list = None
+    responses: list = None
+
+    def to_dict(self):
+        d = {'Method': self.method}
+        if self.description is not None:
+            d['Description'] = self.description
+        if self.query_parameters is not None:
+            d['Query parameters'] = [p.to_dict() for p in self.query_parameters]
+        if self.body_parameters is not None:
+            d['Body parameters'] = [p.to_dict() for p in self.body_parameters]
+        if self.responses is not None:
+            d['HTTP responses'] = [r.to_dict() for r in self.responses]
+        return d
+
+@dataclasses.dataclass(slots=True)
+class Endpoint:
+    path: str
+    global_path_parameters: list = None
+    global_query_parameters: list = None
+    methods: list = dataclasses.field(default_factory=list)
+
+    def to_dict(self):
+        d = {'Endpoint': self.path}
+        if self.global_path_parameters is not None:
+            d['Global path parameters'] = [p.to_dict(False) for p in self.global_path_parameters]
+        if self.global_query_parameters is not None:
+            d['Global query parameters'] = [p.to_dict(False) for p in self.global_query_parameters]
+        if self.methods:
+            d['HTTP method'] = [m.to_dict() for m in self.methods]
+        return d
+
+@dataclasses.dataclass(slots=True)
+class SummaryMethod:
+    method: str
+    description: str
+
+@dataclasses.dataclass(slots=True)
+class ApiReference:
+    title: str = ''
+    url: str = ''
+    version: str = ''
+    summary: dict = None # endpoint -> [SummaryMethod]
+    endpoints: list = dataclasses.field(default_factory=list) # or an iterator, see iter_adoc()
+    diagnostics: list = dataclasses.field(default_factory=list) # complete once endpoints are
+
+    # same structure as the JSON output
+    def summary_dict(self):
+        return {ep: [{'method': m.method, 'description': m.description} for m in methods] for ep, methods in self.summary.items()}
+
+    def to_dict(self):
+        d = {'url': self.url, 'items': [e.to_dict() for e in self.endpoints]}
+        if self.summary is not None:
+            d['summary'] = self.summary_dict()
+        return d
+
+# A problem found in a page, with its line number. Errors stop the parser
+# unless it recovers from them; text is then the table which was left out.
+@dataclasses.dataclass(slots=True)
+class Diagnostic:
+    line: int
+    severity: str # 'error' or 'warning'
+    message: str
+    text: str = None
+
+class ParseError(ValueError):
+    pass
+
+# Refs are read from the files of the repo like git does, without running it:
+# HEAD (also of a worktree, whose .git is a file, or of a bare repo), loose
+# refs and packed-refs.
+def git_dir(repodir):
+    path = os.path.join(repodir, '.git')
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            line = f.readline().strip()
+        return os.path.join(repodir, line[len('gitdir: '):]) if line.startswith('gitdir: ') else None
+    if os.path.isdir(path):
+        return path
+    if os.path.isfile(os.path.join(repodir, 'HEAD')) and os.path.isdir(os.path.join(repodir, 'refs')):
+        return repodir
+    return None
+
+def read_git_ref(gitdir, ref):
+    # refs other than HEAD are shared by all worktrees
+    commondir = gitdir
+    if ref != 'HEAD' and os.path.exists(os.path.join(gitdir, 'commondir')):
+        with open(os.path.join(gitdir, 'commondir'), 'r') as f:
+            commondir = os.path.join(gitdir, f.readline().strip())
+    try:
+        with open(os.path.join(commondir, ref), 'r') as f:
+            return f.readline().strip()
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(commondir, 'packed-refs'), 'r') as f:
+            for line in f:
+                sha, _, name = line.rstrip('\n').partition(' ')
+                if name == ref:
+                    return sha
+    except OSError:
+        pass
+    return None
+
+# Returns (ref, commit id) of name, which is HEAD, a ref, a tag, branch or
+# remote branch name as in "git rev-parse", or a commit id; ref is None for a
+# commit id or a detached HEAD, the commit id is None for a branch without
+# commits yet, and both are None if name is not found.
+def resolve_git_ref(repodir, name='HEAD'):
+    gitdir = git_dir(repodir)
+    if gitdir is not None:
+        for ref in [name, 'refs/' + name, 'refs/tags/' + name, 'refs/heads/' + name, 'refs/remotes/' + name]:
+            value = read_git_ref(gitdir, ref)
+            symbolic = False
+            for _ in range(5): # symbolic refs, as HEAD -> refs/heads/main
+                if value is None or not value.startswith('ref: '):
+                    break
+                ref = value[len('ref: '):]
+                value = read_git_ref(gitdir, ref)
+                symbolic = True
+            if value or symbolic:
+                return (None if ref == 'HEAD' else ref), value or None
+    if re.fullmatch(r'[0-9a-f]{40}', name):
+        return None, name
+    return None, None
+
+# The commit of adoc2xlsx.py in its own repo (not the one of the current
+# directory), or __version__ if it isn't in one. Resolved once, as it's the
+# code which has been loaded.
+@functools.lru_cache(maxsize=None)
+def generator_commit():
+    return resolve_git_ref(os.path.dirname(os.path.abspath(__file__)))[1] or __version__
+
+generator_url = 'https://github.com/orimanabu/openshift_rest_api_adoc2xlsx.git'
+
+# What the outputs of a run are generated from, resolved once per run and
+# shared by all writers: the Info sheet and the document properties of xlsx,
+# the metadata table of sqlite and the generator of the batch manifest.
+@dataclasses.dataclass(frozen=True)
+class RunMetadata:
+    generator: str
+    timestamp: float
+    source_commit: str = None
+    source_ref: str = None
+    version: str = None
+
+    def items(self):
+        return [
+            ('generator', self.generator),
+            ('generator_url', generator_url),
+            ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.timestamp))),
+            ('source_commit', self.source_commit),
+            ('source_ref', self.source_ref),
+            ('version', self.version),
+        ]
+
+# repodir is the openshift-docs repo, read at ref or in the working tree.
+def run_metadata(repodir=None, ref=None, version=None):
+    source_ref = source_commit = None
+    if repodir is not None:
+        source_ref, source_commit = resolve_git_ref(repodir, ref or 'HEAD')
+        if source_ref is None and ref:
+            source_ref = ref
+        elif source_ref and source_ref.startswith('refs/heads/'):
+            source_ref = source_ref[len('refs/heads/'):]
+    return RunMetadata(generator_commit(), time.time(), source_commit, source_ref, version)
+
+# The OCP version of the branch checked out in repodir, which can also be a
+# worktree.
 def get_ocp_version_from_dotgit(repodir):
-    with open('/'.join([repodir, '.git', 'HEAD']), 'r') as f:
-        line = f.readline().rstrip()
-        m = re.search(r'^.*enterprise-([0-9]+\.[0-9]+)$', line)
-        return m.group(1)
+    ref = resolve_git_ref(repodir)[0]
+    version = version_from_ref(ref or '')
+    if version is None:
+        raise ValueError('cannot find OCP version in the branch of {}: {}'.format(repodir, ref or 'no branch checked out'))
+    return version
 
 
-def adoc_path2url(path):
+def adoc_path2url(path, version=None):
     dirname, adoc = os.path.split(path)
     dirname, category = os.path.split(dirname)
     topdir, restapi = os.path.split(dirname)
-    version = get_ocp_version_from_dotgit(topdir)
+    if version is None:
+        version = get_ocp_version_from_dotgit(topdir)
     return version, '/'.join([url_prefix, version, restapi, category, adoc.replace('.adoc', '.html')])
 
 def xref2url(path, version):
     return '/'.join([url_prefix, version, 'rest_api', path[3:].replace('.adoc', '.html')])
 
-def skip_header(file):
-    for line in file:
-        if line.startswith('= '):
-            m = re.search(r'^= (.*) \[.*$', line)
-            title = m.group(1)
-        if line.startswith('== API endpoints'):
-            logger.info('** API endoints')
-            break
-    return title
+cell_separator = re.compile(r'\|[ \n]')
+cols_attribute = re.compile(r'cols="([^"]*)"')
+column_repeat = re.compile(r'\s*([0-9]+)\*')
+xref_link = re.compile(r'xref:(.*)\[`([^]]+)`\]')
+
+def table_columns(line):
+    # [cols="1,1,2",options="header"] or [cols="3*",...]
+    m = cols_attribute.search(line)
+    if not m:
+        return None
+    columns = 0
+    for spec in m.group(1).split(','):
+        n = column_repeat.match(spec)
+        columns = columns + (int(n.group(1)) if n else 1)
+    return columns
+
+# Returns record(row) for each row of a table body. The lines are joined and
+# split into cells once, and the cells are sliced into rows of the column
+# count given by the [cols=...] line.
+def table_rows(lines, record, columns=3, warn=None):
+    cells = cell_separator.split(html.unescape(''.join(lines)))
+    del cells[0] # text before the first cell
+    if len(cells) % columns:
+        if warn:
+            warn('{} cells are not a multiple of {} columns, the last row is padded'.format(len(cells), columns))
+        cells.extend([''] * (columns - len(cells) % columns))
+    rows = [record(cells[i:i + columns]) for i in range(0, len(cells), columns)]
+    if tracing:
+        trace('table', columns=columns, rows=rows)
+    return rows
 
-def parse_table(file):
-    for line in file:
-        if line.startswith('[cols='):
-            continue
-        if line.startswith('|==='):
-            line = file.readline() # for table header
-            break;
-
-    table_str = ''
-    for line in file:
-        if line.startswith('|==='):
-            break;
-        table_str = table_str + html.unescape(line)
-
-    array = re.split(r'\|[ \n]', table_str)
-    array.pop(0) # discard empty
-    logger.info('*** array: ' + str(array))
-    return array
-
-def parse_global_path_parameters(file):
-    mode = 'Global path parameters'
-    apiref[mode] = []
-    array = parse_table(file)
+# Names, types and descriptions recur in every page (and descriptions of
+# common parameters like dryRun thousands of times in a tree), so the strings
+# of the model are interned and shared by all pages and writers.
+def global_parameter(row):
+    return Parameter(sys.intern(row[0].rstrip()[1:-1]), sys.intern(row[1].rstrip()[1:-1]), sys.intern(row[2]) if len(row) > 2 else '')
+
+# Cached by type cell and version, as the same few hundred types make up
+# almost all of them; bounded for long-running processes.
+@functools.lru_cache(maxsize=4096)
+def parse_http_method_xref(line, version):
+    if line.startswith('xref:'):
+        m = xref_link.search(line)
+        if m is None:
+            raise ValueError('malformed xref: {}'.format(line))
+        path = m.group(1)
+        value = m.group(2)
+        hyperlink = xref2url(path, version)
+        return sys.intern(value), sys.intern(hyperlink)
+    return sys.intern(line[1:-1]), None
+
+def http_method_parameter(row, version):
+    value, hyperlink = parse_http_method_xref(row[1].rstrip(), version)
+    if tracing:
+        trace('parameter type', value=value, link=hyperlink)
+    return Parameter(sys.intern(row[0].rstrip()[1:-1]), value, sys.intern(row[2]) if len(row) > 2 else '', hyperlink)
+
+def http_response(row, version):
+    value, hyperlink = parse_http_method_xref(row[1].rstrip(), version)
+    if tracing:
+        trace('response body', value=value, link=hyperlink)
+    return Response(sys.intern(row[0].rstrip()), value, hyperlink)
+
+# Token kinds of the lines of a page, tried in this order. A table is a
+# single 'table' token of the lines between its |=== delimiters, and lines
+# which match nothing are 'text' tokens.
+token_patterns = [
+    ('title', r'= (?P<title_text>.*) \[.*$'),
+    ('summary', r'== API endpoints'),
+    ('summary_endpoint', r'\* `(?P<summary_path>.*)`'),
+    ('summary_method', r'- `(?P<summary_name>.*)`: (?P<summary_text>.*)'),
+    ('endpoint', r'=== (?P<path>/api.*)'),
+    ('caption', r'\.(?P<caption_name>Global path parameters|Global query parameters|Query parameters|Body parameters|HTTP responses)'),
+    ('methods', r'HTTP method::'),
+    ('method', r'\s*`(?P<method_name>GET|PUT|POST|DELETE|PATCH)`'),
+    ('description', r'Description::'),
+    ('table_cols', r'\[cols='),
+    ('table', r'\|==='),
+]
+line_pattern = re.compile('|'.join('(?P<{}>{})'.format(kind, pattern) for kind, pattern in token_patterns))
+
+# Lines which can't be in a table. A table which runs into one of them ends
+# there, unterminated.
+table_breaks = {'endpoint', 'caption', 'methods'}
+# The first characters of those lines, so that the other lines of a table
+# aren't matched against line_pattern.
+table_break_starts = {'=', '.', 'H'}
+
+# Yields (kind, match, line, lineno) for each line of file, or (kind, match,
+# lines, lineno) for a table, with the line number of its opening |===. A
+# table which isn't closed by |=== before the end of the file or the next
+# endpoint, caption or 'HTTP method::' is an 'unterminated_table'.
+def tokenize(file, close=False):
+    match = line_pattern.match
+    lines = enumerate(file, 1)
+    try:
+        for lineno, line in lines:
+            while line is not None:
+                m = match(line)
+                if m is None:
+                    yield 'text', None, line, lineno
+                    break
+                kind = m.lastgroup
+                if kind != 'table':
+                    yield kind, m, line, lineno
+                    break
+                start = lineno
+                body = []
+                kind = 'unterminated_table'
+                line = None
+                for lineno, next_line in lines:
+                    if next_line.startswith('|==='):
+                        kind = 'table'
+                        break
+                    n = next_line[:1] in table_break_starts and match(next_line)
+                    if n and n.lastgroup in table_breaks:
+                        line = next_line # tokenized after the table
+                        break
+                    body.append(next_line)
+                yield kind, m, body, start
+    finally:
+        if close:
+            file.close()
+
+# A table announced by a caption, read until its closing delimiter and then
+# stored in the attribute of target. Its first row is the header, which
+# starts with the header cell of the kind of table.
+@dataclasses.dataclass(slots=True)
+class PendingTable:
+    target: object
+    caption: str
+    attribute: str
+    record: object
+    columns: int = 3
+    header: str = 'Parameter'
+
+    def finish(self, lines, warn=None):
+        if lines and not lines[0].startswith('| {} '.format(self.header)):
+            raise ValueError('header does not start with {}: {}'.format(self.header, lines[0].rstrip()))
+        with profile_stage('model'):
+            rows = table_rows(lines[1:], self.record, self.columns, warn) # without the header
+        setattr(self.target, self.attribute, rows)
+        if profiler:
+            profiler.count('model', rows=len(rows))
+
+endpoint_tables = {
+    'Global path parameters': 'global_path_parameters',
+    'Global query parameters': 'global_query_parameters',
+}
+method_tables = {
+    'Query parameters': 'query_parameters',
+    'Body parameters': 'body_parameters',
+    'HTTP responses': 'responses',
+}
+
+# Yields the endpoints of a page one by one as they are parsed, filling in
+# the title and the summary of ref on the way. The states are 'page' before
+# the summary, 'summary', 'endpoint' after an endpoint header, 'methods'
+# after 'HTTP method::', and 'description' after 'Description::' (the next
+# line is the description). Malformed tables raise ParseError, or with
+# recover, are left out and recorded in ref.diagnostics with the rest of the
+# page parsed as usual.
+def iter_endpoints(tokens, ref, recover=False):
+    parameter = functools.partial(http_method_parameter, version=ref.version)
+    response = functools.partial(http_response, version=ref.version)
+    state = 'page'
+    endpoint = method = table = None
+    summary_methods = []
+    lineno = 0
+
+    def warning(lineno, message):
+        ref.diagnostics.append(Diagnostic(lineno, 'warning', message))
+
+    # a table which fails the page, or is left out of it with recover
+    def error(lineno, table, reason, text=None):
+        if not recover:
+            raise ParseError('line {}: {} table: {}'.format(lineno, table.caption, reason))
+        ref.diagnostics.append(Diagnostic(lineno, 'error', '{} table left out: {}'.format(table.caption, reason), text))
+
+    for kind, m, line, lineno in tokens:
+        if tracing:
+            trace('token', kind=kind, lineno=lineno, line=line if kind.endswith('table') else line.rstrip())
+        if table is not None and kind in table_breaks:
+            # the next section begins before the table of the caption, and
+            # is parsed as usual
+            error(lineno, table, 'no table after the caption')
+            table = None
+        if table is not None:
+            # lines between the caption and the table are skipped
+            if kind == 'table':
+                try:
+                    table.finish(line, lambda message: warning(lineno, '{}: {}'.format(table.caption, message)))
+                except (ValueError, IndexError) as e:
+                    error(lineno, table, e, ''.join(line))
+                table = None
+            elif kind == 'unterminated_table':
+                error(lineno, table, 'no closing |===', ''.join(line))
+                table = None
+            elif kind == 'table_cols':
+                table.columns = table_columns(line) or table.columns
+        elif state == 'description':
+            method.description = line.strip()
+            if tracing:
+                trace('description', description=method.description)
+            state = 'methods'
+        elif kind == 'endpoint':
+            if endpoint:
+                yield endpoint
+            endpoint = Endpoint(m.group('path').rstrip())
+            if tracing:
+                trace('endpoint', endpoint=endpoint.path)
+            state = 'endpoint'
+        elif state == 'methods':
+            if kind == 'method':
+                method = Method(m.group('method_name'))
+                endpoint.methods.append(method)
+                if tracing:
+                    trace('http method', method=method.method)
+            elif kind == 'description':
+                state = 'description'
+            elif kind == 'caption' and m.group('caption_name') in method_tables:
+                caption = m.group('caption_name')
+                if not method.method:
+                    warning(lineno, '{} table before the first HTTP method, ignored'.format(caption))
+                if caption == 'HTTP responses':
+                    table = PendingTable(method, caption, method_tables[caption], response, 2, 'HTTP code')
+                else:
+                    table = PendingTable(method, caption, method_tables[caption], parameter)
+        elif kind == 'title':
+            ref.title = m.group('title_text')
+        elif kind == 'summary':
+            state = 'summary'
+            ref.summary = {}
+            if tracing:
+                trace('summary')
+        elif state == 'summary' and kind == 'summary_endpoint':
+            summary_methods = ref.summary[m.group('summary_path')] = []
+            if tracing:
+                trace('summary endpoint', endpoint=m.group('summary_path'))
+        elif state == 'summary' and kind == 'summary_method':
+            summary_methods.append(SummaryMethod(m.group('summary_name'), m.group('summary_text').rstrip()))
+            if tracing:
+                trace('summary method', method=m.group('summary_name'))
+        elif state == 'summary' and kind == 'text' and line.startswith(('* ', '- ')):
+            warning(lineno, 'summary line not recognized, ignored: {}'.format(line.rstrip()))
+        elif endpoint is None:
+            pass
+        elif kind == 'caption' and m.group('caption_name') in endpoint_tables:
+            caption = m.group('caption_name')
+            table = PendingTable(endpoint, caption, endpoint_tables[caption], global_parameter)
+        elif kind == 'methods':
+            state = 'methods'
+            method = Method('') # placeholder until the first method
+    if table is not None:
+        warning(lineno, '{} table is missing'.format(table.caption))
+        table.finish([])
+    if not ref.title:
+        warning(1, 'no title')
+    if endpoint:
+        yield endpoint
+
+# Same as parse_adoc(), but the endpoints of the returned ApiReference are an
+# iterator which parses the page lazily. The title and the summary are set
+# once the first endpoint has been read, and the diagnostics once the last.
+def iter_adoc(source, version=None, url=None, recover=False):
+    if isinstance(source, (str, os.PathLike)):
+        if url is None:
+            version, url = adoc_path2url(os.fspath(source), version)
+        if tracing:
+            trace('ocp version', version=version, url=url)
+        ref = ApiReference(url=url, version=version)
+        tokens = tokenize(open(source, 'r'), close=True)
+    else:
+        ref = ApiReference(url=url or '', version=version or '')
+        tokens = tokenize(source)
+    if profiler:
+        # one stage after the other, to time them separately
+        with profiler.stage('tokenize'):
+            tokens = list(tokens)
+        profiler.count('tokenize', tokens=len(tokens))
+        with profiler.stage('parse'):
+            ref.endpoints = list(iter_endpoints(tokens, ref, recover))
+        profiler.count('parse', endpoints=len(ref.endpoints), methods=sum(len(endpoint.methods) for endpoint in ref.endpoints))
+    else:
+        ref.endpoints = iter_endpoints(tokens, ref, recover)
+    return ref
+
+# Parses a REST API reference page. source is a path of the adoc, whose OCP
+# version and docs URL are derived from the openshift-docs checkout, or a
+# file object. Malformed tables raise ParseError, or with recover, are left
+# out and listed in ref.diagnostics.
+def parse_adoc(source, version=None, url=None, recover=False):
+    ref = iter_adoc(source, version, url, recover)
+    ref.endpoints = list(ref.endpoints)
+    return ref
+
+# Opens filename + '.tmp', which replaces filename once it has been written
+# completely; if writing fails, e.g. on a ParseError halfway through a page,
+# it is removed and the last good output is left in place.
+@contextlib.contextmanager
+def replace_file(filename, mode='w', newline=None):
+    tmp = filename + '.tmp'
+    try:
+        with open(tmp, mode, newline=newline) as f:
+            yield f
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
 
+def open_output(filename, newline=None):
+    if filename == '-' or filename == None:
+        return contextlib.nullcontext(sys.stdout)
+    if isinstance(filename, io.StringIO):
+        return contextlib.nullcontext(filename)
+    return replace_file(filename, newline=newline)
+
+# Saves text, a str or an iterable of str chunks which are written as they
+# come. On stdout, the text ends with a newline.
+def save_text(text, filename, newline=None):
+    if isinstance(text, str):
+        text = [text]
+    with open_output(filename, newline) as f:
+        chunk = ''
+        for chunk in text:
+            f.write(chunk)
+        if f is sys.stdout and chunk and not chunk.endswith('\n'):
+            f.write('\n')
+
+# CSV column layout: the fixed columns, then one group of columns per
+# (section, subsection), each mapping a header to an attribute of the record.
+# Values with a hyperlink are flattened to a value column and a hyperlink
+# column.
+csv_fixed_columns = ['Endpoint', 'Section', 'Subsection', 'HTTP method']
+csv_column_groups = [
+    ('Global path parameters', '', [('Parameter', 'name'), ('Type', 'type'), ('Description', 'description')]),
+    ('Global query parameters', '', [('Parameter', 'name'), ('Type', 'type'), ('Description', 'description')]),
+    ('HTTP method', 'Query parameters', [('Parameter', 'name'), ('Type', 'type'), ('Type - Hyperlink', 'hyperlink'), ('Description', 'description')]),
+    ('HTTP method', 'Body parameters', [('Parameter', 'name'), ('Type', 'type'), ('Type - Hyperlink', 'hyperlink'), ('Description', 'description')]),
+    ('HTTP method', 'HTTP responses', [('HTTP code', 'code'), ('HTTP Response body', 'body'), ('HTTP Response body - Hyperlink', 'hyperlink')]),
+]
+
+def csv_layout(fixed, groups):
+    header = list(fixed)
+    for section, subsection, columns in groups:
+        header += [' - '.join(filter(None, [section, subsection, name])) for name, attr in columns]
+    layout = {}
+    offset = len(fixed)
+    for section, subsection, columns in groups:
+        getter = operator.attrgetter(*[attr for name, attr in columns])
+        after = len(header) - offset - len(columns)
+        layout[section, subsection] = ([''] * (offset - len(fixed)), getter, [''] * after)
+        offset += len(columns)
+    return header, layout
+
+csv_header, csv_groups = csv_layout(csv_fixed_columns, csv_column_groups)
+
+def csv_records(endpoint):
+    yield 'Global path parameters', '', '', endpoint.global_path_parameters
+    yield 'Global query parameters', '', '', endpoint.global_query_parameters
+    for method in endpoint.methods:
+        yield 'HTTP method', 'Query parameters', method.method, method.query_parameters
+        yield 'HTTP method', 'Body parameters', method.method, method.body_parameters
+        yield 'HTTP method', 'HTTP responses', method.method, method.responses
+
+def csv_rows(ref):
+    yield [ref.url]
+    yield csv_header
+    for endpoint in ref.endpoints:
+        for section, subsection, method, items in csv_records(endpoint):
+            if not items:
+                continue
+            before, getter, after = csv_groups[section, subsection]
+            fixed = [endpoint.path, section, subsection, method]
+            for item in items:
+                yield fixed + before + ['' if value is None else value for value in getter(item)] + after
+
+# The text of csv_rows(), in chunks of up to size rows.
+def csv_chunks(ref, size=1000):
+    import itertools
+    buf = io.StringIO(newline='')
+    writer = csv.writer(buf, quoting=csv.QUOTE_ALL)
+    rows = csv_rows(ref)
+    count = cells = 0
     while True:
-        if len(array) == 0:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
             break
-        param = {}
-        x = array.pop(0)
-        param['Parameter'] = x.rstrip()[1:-1]
+        with profile_stage('serialize'):
+            writer.writerows(chunk)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        count += len(chunk)
+        cells += sum(map(len, chunk))
+    if profiler:
+        profiler.count('render', rows=count, cells=cells)
+
+def print_csv(ref, filename):
+    save_text(csv_chunks(ref), filename, newline='')
+
+def info_rows(metadata):
+    import datetime
+    rows = [
+        ('This book is generated by adoc2xlsx.py at {}.'.format(datetime.datetime.fromtimestamp(metadata.timestamp)), None),
+        ('The commit id of adoc2xlsx.py is: {}.'.format(metadata.generator), None),
+        (generator_url, generator_url),
+    ]
+    if metadata.source_commit:
+        rows.append(('The commit id of openshift-docs{} is: {}.'.format(' ({})'.format(metadata.source_ref) if metadata.source_ref else '', metadata.source_commit), None))
+    return rows
 
-        x = array.pop(0)
-        param['Type'] = x.rstrip()[1:-1]
+def set_properties(book, metadata, title=None):
+    import datetime
+    from openpyxl.packaging.custom import StringProperty
+    book.properties.creator = 'adoc2xlsx.py'
+    book.properties.title = title
+    book.properties.created = book.properties.modified = datetime.datetime.fromtimestamp(metadata.timestamp, datetime.timezone.utc).replace(tzinfo=None)
+    book.properties.version = metadata.version
+    for name, value in metadata.items():
+        if value:
+            book.custom_doc_props.append(StringProperty(name=name, value=value))
+
+# The xlsx writers first lay out the rows of each sheet as (kind, outline
+# level, values, links by column), and then render them. Rows of these kinds
+# are filled from a column on with a named style, which is registered once
+# per workbook.
+xlsx_row_styles = {
+    'endpoint': ('API endpoint', 'D9EAD3', 1),
+    'section': ('API section', 'FCE5CD', 2),
+    'method': ('API method', 'CFE2F3', 3),
+    'subsection': ('API subsection', 'FFF2CC', 3),
+}
+
+def summary_layout(ref):
+    for ep, methods in (ref.summary or {}).items():
+        yield 'endpoint', 0, [ep], None
+        for item in methods:
+            yield 'item', 0, ['', item.method, item.description], None
+
+# Endpoints are at outline level 0, their parameters and methods at 1, and
+# the parameters and responses of methods at 2.
+def page_layout(ref):
+    yield 'url', 0, [ref.url], {1: ref.url}
+    for endpoint in ref.endpoints:
+        yield 'endpoint', 0, [endpoint.path], None
+
+        for section, params in [('Global path parameters', endpoint.global_path_parameters), ('Global query parameters', endpoint.global_query_parameters)]:
+            yield 'section', 1, ['', section, '', 'Parameter', 'Type', 'Description'], None
+            if not params:
+                yield 'item', 1, ['', '', '', '-', '-', '-'], None
+            else:
+                for item in params:
+                    yield 'item', 1, ['', '', '', item.name, item.type, item.description.rstrip()], None
 
-        x = array.pop(0)
-        param['Description'] = x
+        yield 'section', 1, ['', 'HTTP method', 'Method', '', '', 'Description'], None
 
-        apiref[mode].append(param)
+        for method in endpoint.methods:
+            yield 'method', 1, ['', '', method.method, '', '', method.description], None
 
-def parse_global_query_parameters(file):
-    mode = 'Global query parameters'
-    apiref[mode] = []
-    array = parse_table(file)
+            for subsection, params in [('Query parameters', method.query_parameters), ('Body parameters', method.body_parameters)]:
+                yield 'subsection', 2, ['', '', '({}: {})'.format(method.method, subsection), 'Parameter', 'Type', 'Description'], None
+                if not params:
+                    yield 'item', 2, ['', '', '', '-', '-', '-'], None
+                else:
+                    for item in params:
+                        yield 'item', 2, [None, None, None, item.name, item.type, item.description.rstrip()], {5: item.hyperlink}
 
-    while True:
-        if len(array) == 0:
-            break
-        param = {}
-        x = array.pop(0)
-        param['Parameter'] = x.rstrip()[1:-1]
+            yield 'subsection', 2, ['', '', '({}: HTTP responses)'.format(method.method), 'HTTP code', 'Response body'], None
+            if not method.responses:
+                yield 'item', 2, ['', '', '', '-', '-'], None
+            else:
+                for item in method.responses:
+                    yield 'item', 2, [None, None, None, item.code, item.body], {5: item.hyperlink}
+
+        yield 'blank', 0, [''], None
+
+def info_layout(metadata):
+    for text, hyperlink in info_rows(metadata):
+        yield 'info', 0, [text], {1: hyperlink}
+
+# The named styles have the default font and border of the workbook, as a
+# NamedStyle without them would write an empty font.
+def register_styles(book):
+    import copy
+    import openpyxl
+    for name, color, _ in xlsx_row_styles.values():
+        fill = openpyxl.styles.PatternFill(patternType='solid', fgColor=color)
+        book.add_named_style(openpyxl.styles.NamedStyle(name, font=copy.copy(openpyxl.styles.fonts.DEFAULT_FONT), fill=fill, border=copy.copy(openpyxl.styles.borders.DEFAULT_BORDER)))
+
+# Renders the rows of layout to a new sheet, in order, so it works the same
+# with write-only sheets. Filled rows are padded to width columns. Cells get
+# the named style of their row kind, so no fill is created per cell, and the
+# empty cells of the wrapped column are left to its column format. With
+# outline, rows are grouped by their level.
+def render_layout(sheet, layout, width=0, wrap_column=None, outline=False):
+    import openpyxl
+    wrap = openpyxl.styles.Alignment(wrap_text=True)
+    if wrap_column:
+        sheet.column_dimensions[openpyxl.utils.get_column_letter(wrap_column)].alignment = wrap
+    if outline:
+        sheet.sheet_properties.outlinePr = openpyxl.worksheet.properties.Outline(summaryBelow=False)
+        sheet.sheet_format.outlineLevelRow = 2
+    write_only = sheet.parent.write_only
+    rows = cells = 0
+    for y, (kind, level, values, links) in enumerate(layout, 1):
+        named = xlsx_row_styles.get(kind)
+        row = []
+        for x in range(1, max(len(values), width if named else 0) + 1):
+            value = values[x - 1] if x <= len(values) else None
+            link = links.get(x) if links else None
+            filled = named is not None and x >= named[2]
+            wrapped = x == wrap_column and (value is not None or filled)
+            if not (filled or wrapped or link):
+                if write_only:
+                    row.append(value)
+                elif value is not None:
+                    # append() would create cells for None too
+                    sheet.cell(y, x, value)
+                continue
+            if write_only:
+                cell = openpyxl.cell.WriteOnlyCell(sheet, value)
+                row.append(cell)
+            else:
+                cell = sheet.cell(y, x, value)
+            if filled:
+                cell.style = named[0]
+            elif link:
+                cell.style = 'Hyperlink'
+            if wrapped:
+                cell.alignment = wrap
+            if link:
+                cell.hyperlink = link
+        if outline and level:
+            sheet.row_dimensions[y].outline_level = level
+        if write_only:
+            sheet.append(row)
+        if outline and level and write_only:
+            del sheet.row_dimensions[y] # written
+        rows = rows + 1
+        cells = cells + sum(1 for value in values if value is not None)
+    if profiler:
+        profiler.count('render', rows=rows, cells=cells)
+
+# Builds the workbook of a page. With write_only, rows are written out as
+# they are rendered, so the workbook is never held in memory as a whole.
+def build_xlsx(ref, metadata=None, write_only=False, outline=False):
+    import openpyxl
+    book = openpyxl.Workbook(write_only=write_only)
+    if not write_only:
+        book.remove(book.active)
+    register_styles(book)
+
+    sheet = book.create_sheet('Summary')
+    sheet.column_dimensions[openpyxl.utils.get_column_letter(3)].width = 90
+    render_layout(sheet, summary_layout(ref), 3)
 
-        x = array.pop(0)
-        param['Type'] = x.rstrip()[1:-1]
+    sheet = book.create_sheet(ref.title)
+    for x, width in [(2, 25), (3, 30), (4, 30), (5, 20), (6, 90)]:
+        sheet.column_dimensions[openpyxl.utils.get_column_letter(x)].width = width
+    render_layout(sheet, page_layout(ref), 6, 6, outline)
 
-        x = array.pop(0)
-        param['Description'] = x
+    if metadata is None:
+        metadata = run_metadata(version=ref.version)
+    render_layout(book.create_sheet('Info'), info_layout(metadata))
+    set_properties(book, metadata, ref.title)
 
-        apiref[mode].append(param)
+    return book
 
-def is_http_method(line):
-    http_methods = ['GET', 'PUT', 'POST', 'DELETE', 'PATCH'];
-    for method in http_methods:
-        if line.lstrip().startswith('`' + method + '`'):
-            return True, method
-    return False, ""
+# Saves a workbook, or its serialized bytes.
+def save_xlsx(book, filename):
+    if filename == None:
+        print("Error: needs '--output filename' when output format is xlsx.")
+        exit(1)
+    with replace_file(filename, 'wb') as f:
+        if isinstance(book, bytes):
+            f.write(book)
+        else:
+            book.save(f)
+
+def print_xlsx(ref, filename, metadata=None, outline=False):
+    save_xlsx(build_xlsx(ref, metadata, outline=outline), filename)
+
+# Appends rows to write-only sheets, for the combined and diff workbooks. A
+# row is filled from column fill_from on, column width is aligned with wrap,
+# and links are hyperlinks by column. openpyxl is imported once per writer.
+class RowWriter:
+    def __init__(self):
+        import openpyxl
+        self.cell = openpyxl.cell.WriteOnlyCell
+
+    def append(self, sheet, values, width=0, fill=None, fill_from=1, wrap=None, links=None):
+        cells = []
+        for i in range(max(len(values), width)):
+            x = i + 1
+            value = values[i] if i < len(values) else None
+            f = fill if x >= fill_from else None
+            w = wrap if x == width else None
+            link = links.get(x) if links else None
+            if f is None and w is None and not link:
+                cells.append(value)
+                continue
+            cell = self.cell(sheet, value)
+            if f:
+                cell.fill = f
+            if w:
+                cell.alignment = w
+            if link:
+                cell.style = 'Hyperlink'
+                cell.hyperlink = link
+            cells.append(cell)
+        sheet.append(cells)
+        if profiler:
+            profiler.count('render', rows=1, cells=sum(1 for value in values if value is not None))
+
+# Same output as print_xlsx, with write-only worksheets.
+def build_xlsx_stream(ref, metadata=None, outline=False):
+    return build_xlsx(ref, metadata, True, outline)
+
+def print_xlsx_stream(ref, filename, metadata=None, outline=False):
+    save_xlsx(build_xlsx_stream(ref, metadata, outline), filename)
+
+# Cached, so that the warning is printed once per run and not for each page.
+@functools.lru_cache(maxsize=None)
+def json_dumps(fast=False):
+    if fast:
+        try:
+            import orjson
+            return lambda o: orjson.dumps(o).decode('utf-8')
+        except ImportError:
+            print('Warning: orjson is not installed, using json.', file=sys.stderr)
+    return json.dumps
+
+# json_dumps(), timed as the serialize stage with --profile.
+def profiled_dumps(fast=False):
+    dumps = json_dumps(fast)
+    if profiler is None:
+        return dumps
+    def timed(o):
+        with profiler.stage('serialize'):
+            return dumps(o)
+    return timed
+
+def print_json_dict(d, filename, fast=False):
+    save_text(json_dumps(fast)(d), filename)
+
+# The same document as json_dumps()(ref.to_dict()), in chunks of one endpoint,
+# so neither the whole dict nor the whole string is in memory.
+def json_chunks(ref, fast=False):
+    dumps = profiled_dumps(fast)
+    comma, colon = (',', ':') if fast else (', ', ': ')
+    yield '{{"url"{}{}{}"items"{}['.format(colon, dumps(ref.url), comma, colon)
+    for i, endpoint in enumerate(ref.endpoints):
+        yield (comma if i else '') + dumps(endpoint.to_dict())
+    yield ']'
+    if ref.summary is not None:
+        yield '{}"summary"{}{}'.format(comma, colon, dumps(ref.summary_dict()))
+    yield '}'
+    if profiler:
+        profiler.count('render', records=1)
+
+def print_json(ref, filename, fast=False):
+    save_text(json_chunks(ref, fast), filename)
+
+# One JSON object for each endpoint, or for each method of each endpoint.
+def ndjson_records(ref, unit='endpoint'):
+    for endpoint in ref.endpoints:
+        d = endpoint.to_dict()
+        if unit == 'method':
+            methods = d.pop('HTTP method', [])
+            for method in methods:
+                yield dict(url=ref.url, title=ref.title, **d, **method)
+        else:
+            yield dict(url=ref.url, title=ref.title, **d)
+
+# One line for each record, as soon as its endpoint has been parsed.
+def ndjson_chunks(ref, unit='endpoint', fast=False):
+    dumps = profiled_dumps(fast)
+    count = 0
+    for record in ndjson_records(ref, unit):
+        yield dumps(record) + '\n'
+        count += 1
+    if profiler:
+        profiler.count('render', records=count)
+
+def print_ndjson(ref, filename, unit='endpoint', fast=False):
+    save_text(ndjson_chunks(ref, unit, fast), filename)
+
+@dataclasses.dataclass
+class OutputOptions:
+    stream: bool = False # xlsx with write-only worksheets
+    outline: bool = False # xlsx with endpoints and methods grouped
+    ndjson_unit: str = 'endpoint'
+    fast_json: bool = False
+    metadata: RunMetadata = None # run_metadata() of each page if None
+    recover: bool = False # see iter_endpoints()
+
+# Writers by output format. render() returns the output of a page: its text,
+# as a str or an iterable of chunks, or a workbook. save() writes it to a
+# file, or to stdout for '-'. The modules they need (openpyxl for xlsx) are
+# imported when they are first used, so that the other formats start fast.
+@dataclasses.dataclass(frozen=True)
+class Writer:
+    render: object # (ref, options) -> output
+    save: object # (output, filename) -> None
+
+writers = {}
+
+def writer(format, save):
+    def register(func):
+        writers[format] = Writer(func, save)
+        return func
+    return register
+
+@writer('json', save_text)
+def render_json(ref, options):
+    return json_chunks(ref, options.fast_json)
+
+@writer('ndjson', save_text)
+def render_ndjson(ref, options):
+    return ndjson_chunks(ref, options.ndjson_unit, options.fast_json)
+
+@writer('csv', functools.partial(save_text, newline=''))
+def render_csv(ref, options):
+    return csv_chunks(ref)
+
+@writer('xlsx', save_xlsx)
+def render_xlsx(ref, options):
+    # the xlsx writers need the summary, which comes before endpoints
+    ref.endpoints = list(ref.endpoints)
+    return build_xlsx(ref, options.metadata, options.stream, options.outline)
+
+# The output of render() as a whole: the text is joined, a workbook is
+# left as it is.
+def rendered(output):
+    if isinstance(output, str) or hasattr(output, 'save'):
+        return output
+    return ''.join(output)
+
+# write_output() with the render, serialize and save stages one after the
+# other, for --profile. Text is serialized as it is rendered, in the
+# serialize stage nested in render.
+def profile_output(ref, format, output, options):
+    w = writers[format]
+    if format == 'xlsx' and options.metadata is None:
+        with profiler.stage('metadata'):
+            options = dataclasses.replace(options, metadata=run_metadata(version=ref.version))
+    # rows of xlsx are counted by render_layout()
+    with profiler.stage('render'):
+        data = rendered(w.render(ref, options))
+    if not isinstance(data, str):
+        with profiler.stage('serialize'):
+            buf = io.BytesIO()
+            data.save(buf)
+            data = buf.getvalue()
+    with profiler.stage('save'):
+        w.save(data, output)
+
+def write_output(ref, format, output, options=None):
+    options = options or OutputOptions()
+    if profiler:
+        profile_output(ref, format, output, options)
+    else:
+        w = writers[format]
+        w.save(w.render(ref, options), output)
+
+def convert(adoc, format, output, version=None, options=None):
+    options = options or OutputOptions()
+    if profiler:
+        profiler.page(adoc)
+        with profiler.stage('read'):
+            with open(adoc, 'rb') as f:
+                stream = page_stream(f.read())
+        version, url = adoc_path2url(adoc, version)
+        ref = iter_adoc(stream, version, url, options.recover)
+    else:
+        ref = iter_adoc(adoc, version, recover=options.recover)
+    if options.metadata is None:
+        with profile_stage('metadata'):
+            # the openshift-docs repo of rest_api/<category>/<page>.adoc
+            repodir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(adoc))))
+            options = dataclasses.replace(options, metadata=run_metadata(repodir, version=ref.version))
+    write_output(ref, format, output, options)
+    return ref.diagnostics
+
+def git_blob_id(data):
+    import hashlib
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+def version_from_ref(ref):
+    m = re.search(r'enterprise-([0-9]+\.[0-9]+)$', ref)
+    return m.group(1) if m else None
+
+# Sources of an openshift-docs tree. read() returns the content of a file
+# given by its path in the repo, and blob_id() its git blob id, which is
+# used as the content hash in the build manifest.
+class DirSource:
+    def __init__(self, repodir):
+        self.repodir = repodir
+        self.ref = None # the working tree
+        self.version = get_ocp_version_from_dotgit(repodir)
+        self.blob_ids = {}
+
+    def __str__(self):
+        return self.repodir
+
+    def read(self, path):
+        with open(os.path.join(self.repodir, path), 'rb') as f:
+            return f.read()
+
+    # cached by mtime and size like the git index, so --watch only hashes
+    # the pages which have changed
+    def blob_id(self, path):
+        st = os.stat(os.path.join(self.repodir, path))
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self.blob_ids.get(path)
+        if cached is None or cached[0] != key:
+            cached = self.blob_ids[path] = (key, git_blob_id(self.read(path)))
+        return cached[1]
+
+    def close(self):
+        pass
 
-def parse_http_method_xref(line):
-    if line.startswith('xref:'):
-        m = re.search(r'xref:(.*)\[`([^]]+)`\]', line)
-        path = m.group(1)
-        value = m.group(2)
-        hyperlink = xref2url(path, ocp_version)
-        logger.info('*** ocp_version: ' + ocp_version)
-        return value, hyperlink
-    return line[1:-1], None
-
-def parse_http_method(file):
-    mode = 'HTTP method'
-    apiref[mode] = []
-
-    param = {}
-    for line in file:
-        logger.info('*** line: ' + line.rstrip())
-        b, method = is_http_method(line)
-        if b:
-            logger.info('*** HTTP Method: {}'.format(method))
-            if param.get('Method'):
-                logger.info('*** append(): ' + json.dumps(param))
-                apiref[mode].append(param)
-                param = {}
-            param['Method'] = method
-        elif line.startswith('\n'):
-            # print('*** \\n')
+# Reads files of any ref straight from the object database through one
+# "git cat-file --batch" process, so branches don't need to be checked out
+# and repodir can be a bare mirror.
+class GitSource:
+    def __init__(self, repodir, ref):
+        import subprocess
+        self.repodir = repodir
+        self.ref = ref
+        self.version = version_from_ref(ref)
+        if self.version is None:
+            head = self.git('rev-parse', '--abbrev-ref', ref).strip()
+            self.version = version_from_ref(head)
+        if self.version is None:
+            raise ValueError('cannot find OCP version in ref name: {}'.format(ref))
+        self.blobs = None
+        self.proc = subprocess.Popen(['git', '-C', repodir, 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def __str__(self):
+        return '{}@{}'.format(self.repodir, self.ref)
+
+    def git(self, *args):
+        import subprocess
+        return subprocess.run(['git', '-C', self.repodir] + list(args), check=True, capture_output=True, encoding='utf-8').stdout
+
+    def read(self, path):
+        self.proc.stdin.write('{}:{}\n'.format(self.ref, path).encode('utf-8'))
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().decode('utf-8').split()
+        if header[-1] == 'missing':
+            raise FileNotFoundError('{} not found in {}'.format(path, self))
+        data = self.proc.stdout.read(int(header[2]))
+        self.proc.stdout.read(1) # LF after the content
+        return data
+
+    def blob_id(self, path):
+        if self.blobs is None:
+            self.blobs = {}
+            for line in self.git('ls-tree', '-r', '--full-tree', self.ref, '--', 'rest_api').splitlines():
+                meta, _, name = line.partition('\t')
+                self.blobs[name] = meta.split()[2]
+        if path not in self.blobs:
+            raise FileNotFoundError('{} not found in {}'.format(path, self))
+        return self.blobs[path]
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+def open_source(repodir, ref=None):
+    if ref:
+        return GitSource(repodir, ref)
+    return DirSource(repodir)
+
+def source_metadata(source):
+    return run_metadata(source.repodir, source.ref, source.version)
+
+def page_url(version, file):
+    return '/'.join([url_prefix, version, 'rest_api', file.replace('.adoc', '.html')])
+
+def page_stream(data):
+    return io.StringIO(data.decode('utf-8'), newline=None)
+
+def parse_page(data, version, file, recover=False):
+    return parse_adoc(page_stream(data), version, page_url(version, file), recover)
+
+def read_index(source):
+    # same as do.sh: grep xref: | sed ... | sort -k2,2
+    pages = []
+    for line in source.read('rest_api/index.adoc').decode('utf-8').splitlines():
+        if 'xref:' not in line:
+            continue
+        line = re.sub(r'^.*xref:\./', '', line)
+        line = re.sub(r'#.*\[', ' ', line)
+        line = re.sub(r'\]$', '', line)
+        file, _, title = line.partition(' ')
+        pages.append((file, title.strip()))
+    pages.sort(key=lambda page: (page[1].split()[:1], page))
+    return pages
+
+def read_page(source, file):
+    if profiler is None:
+        return source.read('rest_api/' + file)
+    profiler.page(file)
+    with profiler.stage('read'):
+        return source.read('rest_api/' + file)
+
+def output_name(file, title):
+    return '{}__{}'.format(title, file.replace('/', '__'))
+
+def convert_page(outputdir, format, version, options, file, title, data):
+    output = os.path.join(outputdir, output_name(file, title))
+    try:
+        with profile_stage('read'):
+            stream = page_stream(data)
+        ref = iter_adoc(stream, version, page_url(version, file), options.recover)
+        write_output(ref, format, '{}.{}'.format(output, format), options)
+    except Exception as e:
+        return output, '{}: {}'.format(type(e).__name__, e), []
+    return output, None, [dataclasses.asdict(d) for d in ref.diagnostics]
+
+# The CPU-bound half of convert_page(): parses and renders a page in memory,
+# and returns the output, a function which saves it, and the diagnostics.
+def render_page(outputdir, format, version, options, file, title, data):
+    output = os.path.join(outputdir, output_name(file, title))
+    path = '{}.{}'.format(output, format)
+    try:
+        if isinstance(data, Exception):
+            raise data # from the reader
+        ref = iter_adoc(page_stream(data), version, page_url(version, file), options.recover)
+        w = writers[format]
+        save = functools.partial(w.save, rendered(w.render(ref, options)), path)
+    except Exception as e:
+        return output, None, '{}: {}'.format(type(e).__name__, e), []
+    return output, save, None, [dataclasses.asdict(d) for d in ref.diagnostics]
+
+# Converts pages in three stages connected by queues of at most depth pages:
+# a thread which reads the sources ahead, render_page() in this thread, and a
+# thread which compresses and saves the outputs, so that reading and writing
+# overlap with parsing and rendering (zlib and file I/O release the GIL).
+# Returns a list of (output, error, diagnostics) like convert_page().
+def pipeline_convert(source, outputdir, format, version, options, files, titles, depth=2):
+    import queue
+    import threading
+    pages = queue.Queue(depth)
+    outputs = queue.Queue(depth)
+    results = []
+
+    def read():
+        for file, title in zip(files, titles):
+            try:
+                data = read_page(source, file)
+            except Exception as e:
+                data = e
+            pages.put((file, title, data))
+
+    def write():
+        while True:
+            page = outputs.get()
+            if page is None:
+                break
+            output, save, error, diagnostics = page
+            if save:
+                try:
+                    save()
+                except Exception as e:
+                    error = '{}: {}'.format(type(e).__name__, e)
+            results.append((output, error, diagnostics))
+
+    reader = threading.Thread(target=read, daemon=True)
+    writer = threading.Thread(target=write, daemon=True)
+    reader.start()
+    writer.start()
+    for _ in files:
+        outputs.put(render_page(outputdir, format, version, options, *pages.get()))
+    outputs.put(None)
+    writer.join()
+    return results
+
+def print_diagnostics(name, diagnostics, file=sys.stdout, indent=''):
+    for d in diagnostics:
+        print('{}{}:{}: {}: {}'.format(indent, name, d['line'], d['severity'], d['message']), file=file)
+
+manifest_name = '.adoc2xlsx-manifest.json'
+
+def load_manifest(outputdir):
+    try:
+        with open(os.path.join(outputdir, manifest_name), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(outputdir, manifest):
+    path = os.path.join(outputdir, manifest_name)
+    with replace_file(path) as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+# Diagnostics of the pages of the last runs, with the tables which were left
+# out, by output name.
+diagnostics_name = '.adoc2xlsx-diagnostics.json'
+
+def load_diagnostics(outputdir):
+    try:
+        with open(os.path.join(outputdir, diagnostics_name), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_diagnostics(outputdir, diagnostics):
+    path = os.path.join(outputdir, diagnostics_name)
+    if not diagnostics:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
             pass
-        elif line.startswith('Description::'):
-            line = file.readline()
-            desc = line.rstrip().lstrip()
-            logger.info('*** desc: {}'.format(desc))
-            param['Description'] = desc
-        elif line.startswith('.Query parameters') or line.startswith('.Body parameters'):
-            section = line[1:-1]
-            array = parse_table(file)
-            logger.info('*** array: ' + json.dumps(array))
-            param[section] = []
-            while True:
-                if len(array) == 0:
-                    break
-                tmp = {}
-                tmp['Parameter'] = array.pop(0).rstrip()[1:-1]
-                value, hyperlink = parse_http_method_xref(array.pop(0).rstrip())
-                logger.info('*** parameter type: value={}, link={}'.format(value, hyperlink))
-                tmp['Type'] = {}
-                tmp['Type']['value'] = value
-                tmp['Type']['hyperlink'] = hyperlink
-                tmp['Description'] = array.pop(0)
-                param[section].append(tmp)
-        elif line.startswith('.HTTP responses'):
-            section = line[1:-1]
-            array = parse_table(file)
-            logger.info('*** array: ' + json.dumps(array))
-            param[section] = []
+        return
+    with replace_file(path) as f:
+        json.dump(diagnostics, f, indent=1, sort_keys=True)
+
+def batch_convert(source, outputdir, format, jobs=1, force=False, options=None, show_unchanged=True, pipeline=0):
+    import concurrent.futures
+    os.makedirs(outputdir, exist_ok=True)
+    version = source.version
+    metadata = source_metadata(source)
+    options = dataclasses.replace(options or OutputOptions(), metadata=metadata)
+    pages = read_index(source)
+
+    # all pages are converted again when one of the settings which change
+    # the outputs is not the same as in the last run
+    settings = {'version': version, 'generator': metadata.generator, 'format': format, 'recover': options.recover, 'outline': options.outline, 'ndjson_unit': options.ndjson_unit, 'fast_json': options.fast_json}
+    defaults = dataclasses.asdict(OutputOptions())
+    old = load_manifest(outputdir)
+    if force or any(old.get(key, defaults.get(key)) != value for key, value in settings.items()):
+        old_pages = {}
+    else:
+        old_pages = old.get('pages', {})
+    manifest = dict(settings, pages={})
+    old_diagnostics = load_diagnostics(outputdir)
+    diagnostics = {}
+
+    # skip pages whose source and generator are unchanged since the last run
+    status = {}
+    failures = []
+    files = []
+    titles = []
+    for file, title in pages:
+        name = '{}.{}'.format(output_name(file, title), format)
+        if name in status:
+            continue # listed more than once in index.adoc
+        try:
+            entry = {'source': file, 'blob': source.blob_id('rest_api/' + file)}
+        except OSError as e:
+            status[name] = 'failed'
+            failures.append((os.path.join(outputdir, name), '{}: {}'.format(type(e).__name__, e)))
+            continue
+        manifest['pages'][name] = entry
+        if old_pages.get(name) == entry and os.path.exists(os.path.join(outputdir, name)):
+            status[name] = 'up-to-date'
+            if name in old_diagnostics:
+                diagnostics[name] = old_diagnostics[name]
+        else:
+            status[name] = 'updated' if name in old.get('pages', {}) else 'new'
+            files.append(file)
+            titles.append(title)
+
+    # sources are read here, so workers don't need access to the source
+    func = functools.partial(convert_page, outputdir, format, version, options)
+    data = (read_page(source, file) for file in files)
+    if jobs == 0:
+        jobs = os.cpu_count()
+    if profiler:
+        jobs = 1 # pages are profiled in this process, one stage after the other
+        pipeline = 0
+    if jobs > 1 and len(files) > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        results = executor.map(func, files, titles, data)
+    elif pipeline and len(files) > 1:
+        executor = None
+        results = pipeline_convert(source, outputdir, format, version, options, files, titles, pipeline)
+    else:
+        executor = None
+        results = map(func, files, titles, data)
+
+    found = []
+    for output, error, page_diagnostics in results:
+        name = '{}.{}'.format(os.path.basename(output), format)
+        if error:
+            status[name] = 'failed'
+            manifest['pages'].pop(name, None)
+            failures.append((os.path.join(outputdir, name), error))
+        elif page_diagnostics:
+            diagnostics[name] = page_diagnostics
+            found.append(name)
+    if executor:
+        executor.shutdown()
+
+    # outputs of pages which are no longer listed in index.adoc, or whose
+    # title changed; outputs of another format are left alone
+    sources = {file for file, title in pages}
+    for name, entry in old.get('pages', {}).items():
+        if name not in status and (old.get('format') == format or entry.get('source') not in sources):
+            try:
+                os.remove(os.path.join(outputdir, name))
+            except FileNotFoundError:
+                pass
+            status[name] = 'removed'
+
+    save_manifest(outputdir, manifest)
+    save_diagnostics(outputdir, diagnostics)
+
+    for name in sorted(status, key=lambda name: name not in manifest['pages']):
+        if show_unchanged or status[name] != 'up-to-date':
+            print('=> {} ({})'.format(os.path.join(outputdir, name), status[name]))
+    counts = {}
+    for s in status.values():
+        counts[s] = counts.get(s, 0) + 1
+    print(', '.join('{} {}'.format(counts.get(s, 0), s) for s in ['new', 'updated', 'up-to-date', 'removed', 'failed']) + '.')
+    for output, error in failures:
+        print('  {}: {}'.format(output, error))
+    if found:
+        print('Diagnostics (also in {}):'.format(os.path.join(outputdir, diagnostics_name)))
+        for name in found:
+            print_diagnostics(manifest['pages'][name]['source'], diagnostics[name], indent='  ')
+    return len(failures) == 0
+
+# Watches a directory tree with inotify: wait() returns the paths of the
+# .adoc files and directories which have been written, created, moved or
+# deleted, or an empty set after timeout seconds.
+class InotifyWatcher:
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, topdir):
+        import ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.topdir = topdir
+        self.dirs = {}
+        for dirpath, dirnames, filenames in os.walk(topdir):
+            self.add_watch(dirpath)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask)
+        if wd >= 0:
+            self.dirs[wd] = path
+
+    # Events of other files (editor swap and backup files, temporary files
+    # of sed -i) don't count, so it waits on until an .adoc file or a
+    # directory has changed or the timeout has passed.
+    def wait(self, timeout=None):
+        import select
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if deadline is None else max(0, deadline - time.monotonic())
+            if not select.select([self.fd], [], [], left)[0]:
+                return set()
+            changed = self.read_events()
+            if changed:
+                return changed
+
+    def read_events(self):
+        changed = set()
+        buf = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(buf):
+            # struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+            wd, mask, cookie, length = struct.unpack_from('iIII', buf, offset)
+            name = os.fsdecode(buf[offset + 16:offset + 16 + length].rstrip(b'\0'))
+            offset += 16 + length
+            if mask & self.IN_Q_OVERFLOW:
+                changed.add(self.topdir)
+                continue
+            if wd not in self.dirs:
+                continue
+            path = os.path.join(self.dirs[wd], name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    for dirpath, dirnames, filenames in os.walk(path):
+                        self.add_watch(dirpath)
+                changed.add(path)
+            elif name.endswith('.adoc'):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+# The same by comparing the mtime and size of the .adoc files every interval
+# seconds, where inotify is not available.
+class PollingWatcher:
+    def __init__(self, topdir, interval=0.5):
+        self.topdir = topdir
+        self.interval = interval
+        self.files = self.scan()
+
+    def scan(self):
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.topdir):
+            for name in filenames:
+                if name.endswith('.adoc'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files[path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            files = self.scan()
+            changed = {path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path)}
+            self.files = files
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+def open_watcher(topdir, polling=False):
+    if not polling:
+        try:
+            return InotifyWatcher(topdir)
+        except (OSError, AttributeError) as e:
+            print('Warning: inotify is not available ({}), polling for changes.'.format(e))
+    return PollingWatcher(topdir)
+
+# Converts the pages like batch_convert(), and then again each time pages or
+# index.adoc change. Bursts of changes (editors often write a file several
+# times on save) are collected until nothing has changed for debounce
+# seconds. Only pages whose blob id has changed are converted again.
+def watch_batch(source, outputdir, format, jobs=1, force=False, options=None, debounce=0.2, polling=False, pipeline=0):
+    watcher = open_watcher(os.path.join(source.repodir, 'rest_api'), polling)
+    batch_convert(source, outputdir, format, jobs, force, options, pipeline=pipeline)
+    print('Watching {} for changes (Ctrl-C to stop).'.format(os.path.join(source.repodir, 'rest_api')))
+    try:
+        while True:
+            changed = watcher.wait()
             while True:
-                if len(array) == 0:
+                more = watcher.wait(debounce)
+                if not more:
                     break
-                tmp = {}
-                tmp['HTTP code'] = array.pop(0).rstrip()
-                value, hyperlink = parse_http_method_xref(array.pop(0).rstrip())
-                logger.info('*** response body: value={}, link={}'.format(value, hyperlink))
-                tmp['Response body'] = {}
-                tmp['Response body']['value'] = value
-                tmp['Response body']['hyperlink'] = hyperlink
-                param[section].append(tmp)
-        elif line.startswith('=== /api'):
-            logger.info('*** break: ' + line)
-            break
-
-    logger.info('*** append(): ' + json.dumps(param))
-    apiref[mode].append(param)
-    return line
-
-def csv_indent_section(row, section):
-    if section == 'Global path parameters':
-        pass
-    elif section == 'Global query parameters':
-        row.append('') # Gpp Parameter
-        row.append('') # Gpp Type
-        row.append('') # Gpp Description
-    elif section == 'HTTP method':
-        row.append('') # Gpp Parameter
-        row.append('') # Gpp Type
-        row.append('') # Gpp Description
-        row.append('') # Gqp Parameter
-        row.append('') # Gqp Type
-        row.append('') # Gqp Description
-
-def csv_indent_subsection(row, subsection):
-    if subsection == 'Query parameters':
+                changed |= more
+            if not changed:
+                continue
+            start = time.perf_counter()
+            print('Changed: {}'.format(', '.join(sorted(os.path.relpath(path, source.repodir) for path in changed))))
+            # a failed run (e.g. index.adoc moved away for a moment) is
+            # reported, and the next change runs again
+            try:
+                batch_convert(source, outputdir, format, jobs, False, options, show_unchanged=False, pipeline=pipeline)
+            except Exception as e:
+                print('Error: {}: {}'.format(type(e).__name__, e))
+                continue
+            print('Done in {:.2f}s.'.format(time.perf_counter() - start))
+    except KeyboardInterrupt:
         pass
-    elif subsection == 'Body parameters':
-        row.append('') # Qp Parameter
-        row.append('') # Qp Type
-        row.append('') # Qp Description
-    elif subsection == 'HTTP responses':
-        row.append('') # Qp Parameter
-        row.append('') # Qp Type
-        row.append('') # Qp Description
-        row.append('') # Bp Parameter
-        row.append('') # Bp Type
-        row.append('') # Bp Description
-
-def add_section_global_params(row, rows, section, apiref):
-    if apiref.get(section):
-        for item in apiref[section]:
-            row.append(item['Parameter'])
-            row.append(item['Type'])
-            row.append(item['Description'])
-            rows.append(row)
-            row = []
-
-def add_section_http_method(row, rows, section, subsection, apiref):
-    if not apiref.get(section):
-        return
-    for method in apiref[section]:
-        row.append(method['Method'])
-        row.append(subsection)
-
-        if subsection == 'Query parameters' or subsection == 'Body parameters':
-            array = method.get(subsection)
-            if array:
-                for item in array:
-                    row.append(item['Parameter'])
-                    row.append(item['Type'])
-                    row.append(item['Description'])
-
-        elif subsection == 'HTTP responses':
-            array = method.get(subsection)
-            if array:
-                for item in array:
-                    row.append(item['HTTP code'])
-                    row.append(item['Response body'])
-
-        rows.append(row)
-        row = []
+    finally:
+        watcher.close()
+
+# Rows of a page for the consolidated outputs: one per parameter and HTTP
+# response, as (endpoint, method, section, name, type, hyperlink, description).
+def page_rows(ref):
+    for endpoint in ref.endpoints:
+        for section, params in [('Global path parameters', endpoint.global_path_parameters), ('Global query parameters', endpoint.global_query_parameters)]:
+            for p in params or []:
+                yield endpoint.path, '', section, p.name, p.type, None, p.description.rstrip()
+        for method in endpoint.methods:
+            for section, params in [('Query parameters', method.query_parameters), ('Body parameters', method.body_parameters)]:
+                for p in params or []:
+                    yield endpoint.path, method.method, section, p.name, p.type, p.hyperlink, p.description.rstrip()
+            for r in method.responses or []:
+                yield endpoint.path, method.method, 'HTTP responses', r.code, r.body, r.hyperlink, ''
+
+# One workbook for all pages: an endpoint index, a sheet per category and
+# lookup sheets from parameter names and response types to endpoints. Rows
+# are streamed to write-only sheets, so only the lookup tables are kept in
+# memory across pages.
+class CombinedWorkbook:
+    def __init__(self, filename, metadata):
+        import openpyxl
+        self.filename = filename
+        self.metadata = metadata
+        self.book = openpyxl.Workbook(write_only=True)
+        self.rows = RowWriter()
+        self.fill_header = openpyxl.styles.PatternFill(patternType='solid', fgColor='FCE5CD')
+        self.fill_page = openpyxl.styles.PatternFill(patternType='solid', fgColor='D9EAD3')
+        self.wrap = openpyxl.styles.Alignment(wrap_text=True)
+        self.index = self.add_sheet('Endpoints', ['Category', 'Page', 'Endpoint', 'Method', 'Description'], [20, 30, 60, 10, 90])
+        self.categories = {}
+        self.parameters = {}
+        self.response_types = {}
+
+    def add_sheet(self, title, header, widths):
+        import openpyxl
+        sheet = self.book.create_sheet(title[:31])
+        for i, width in enumerate(widths):
+            sheet.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = width
+        self.rows.append(sheet, header, len(header), self.fill_header)
+        return sheet
+
+    def add_page(self, file, title, ref):
+        category = os.path.dirname(file)
+        sheet = self.categories.get(category)
+        if sheet is None:
+            sheet = self.categories[category] = self.add_sheet(category, ['Page', 'Endpoint', 'Method', 'Section', 'Parameter / HTTP code', 'Type / Response body', 'Description'], [30, 60, 10, 25, 30, 30, 90])
+        self.rows.append(sheet, [title], 7, self.fill_page, links={1: ref.url})
+
+        for endpoint in ref.endpoints:
+            for method in endpoint.methods:
+                self.rows.append(self.index, [category, title, endpoint.path, method.method, method.description], links={2: ref.url})
+        for endpoint, method, section, name, type, hyperlink, description in page_rows(ref):
+            self.rows.append(sheet, ['', endpoint, method, section, name, type, description], 7, wrap=self.wrap, links={6: hyperlink})
+            where = (category, title, endpoint, method)
+            if section == 'HTTP responses':
+                self.response_types.setdefault(type, []).append((name,) + where)
+            else:
+                self.parameters.setdefault(name, []).append((section,) + where)
+
+    def close(self):
+        sheet = self.add_sheet('Parameters', ['Parameter', 'Section', 'Category', 'Page', 'Endpoint', 'Method'], [30, 25, 20, 30, 60, 10])
+        for name in sorted(self.parameters):
+            for where in self.parameters[name]:
+                self.rows.append(sheet, (name,) + where)
+        sheet = self.add_sheet('Response types', ['Response body', 'HTTP code', 'Category', 'Page', 'Endpoint', 'Method'], [30, 25, 20, 30, 60, 10])
+        for type in sorted(self.response_types):
+            for where in self.response_types[type]:
+                self.rows.append(sheet, (type,) + where)
+        sheet = self.book.create_sheet('Info')
+        for text, hyperlink in info_rows(self.metadata):
+            self.rows.append(sheet, [text], links={1: hyperlink})
+        set_properties(self.book, self.metadata, 'OpenShift {} REST API'.format(self.metadata.version))
+        self.book.save(self.filename)
+
+# The same dataset as a SQLite database, with indexes and views for the
+# parameter name and response type lookups. Types (with their hyperlink) and
+# descriptions are stored once in the types and texts tables.
+class CombinedDatabase:
+    schema = """
+        CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE pages (id INTEGER PRIMARY KEY, category TEXT, file TEXT, title TEXT, url TEXT);
+        CREATE TABLE endpoints (id INTEGER PRIMARY KEY, page_id INTEGER REFERENCES pages, path TEXT);
+        CREATE TABLE methods (id INTEGER PRIMARY KEY, endpoint_id INTEGER REFERENCES endpoints, method TEXT, description TEXT);
+        CREATE TABLE types (id INTEGER PRIMARY KEY, name TEXT, hyperlink TEXT);
+        CREATE TABLE texts (id INTEGER PRIMARY KEY, text TEXT);
+        CREATE TABLE parameters (endpoint_id INTEGER REFERENCES endpoints, method_id INTEGER REFERENCES methods, section TEXT, name TEXT, type_id INTEGER REFERENCES types, description_id INTEGER REFERENCES texts);
+        CREATE TABLE responses (method_id INTEGER REFERENCES methods, code TEXT, type_id INTEGER REFERENCES types);
+        CREATE VIEW parameter_details AS
+            SELECT parameters.endpoint_id, parameters.method_id, parameters.section, parameters.name, types.name AS type, types.hyperlink, texts.text AS description
+            FROM parameters JOIN types ON parameters.type_id = types.id JOIN texts ON parameters.description_id = texts.id;
+        CREATE VIEW response_details AS
+            SELECT responses.method_id, responses.code, types.name AS type, types.hyperlink
+            FROM responses JOIN types ON responses.type_id = types.id;
+        CREATE VIEW parameter_index AS
+            SELECT parameters.name, parameters.section, pages.category, pages.title AS page, endpoints.path AS endpoint, methods.method
+            FROM parameters JOIN endpoints ON parameters.endpoint_id = endpoints.id JOIN pages ON endpoints.page_id = pages.id
+            LEFT JOIN methods ON parameters.method_id = methods.id;
+        CREATE VIEW response_type_index AS
+            SELECT types.name AS type, responses.code, pages.category, pages.title AS page, endpoints.path AS endpoint, methods.method
+            FROM responses JOIN types ON responses.type_id = types.id JOIN methods ON responses.method_id = methods.id
+            JOIN endpoints ON methods.endpoint_id = endpoints.id JOIN pages ON endpoints.page_id = pages.id;
+    """
+
+    def __init__(self, filename, metadata):
+        import sqlite3
+        if os.path.exists(filename):
+            os.remove(filename)
+        self.db = sqlite3.connect(filename)
+        self.db.executescript(self.schema)
+        self.db.executemany('INSERT INTO metadata VALUES (?, ?)', metadata.items())
+        self.types = {}
+        self.texts = {}
+
+    def type_id(self, cur, name, hyperlink):
+        id = self.types.get((name, hyperlink))
+        if id is None:
+            cur.execute('INSERT INTO types (name, hyperlink) VALUES (?, ?)', (name, hyperlink))
+            id = self.types[name, hyperlink] = cur.lastrowid
+        return id
+
+    def text_id(self, cur, text):
+        id = self.texts.get(text)
+        if id is None:
+            cur.execute('INSERT INTO texts (text) VALUES (?)', (text,))
+            id = self.texts[text] = cur.lastrowid
+        return id
+
+    def add_page(self, file, title, ref):
+        cur = self.db.cursor()
+        cur.execute('INSERT INTO pages (category, file, title, url) VALUES (?, ?, ?, ?)', (os.path.dirname(file), file, title, ref.url))
+        page_id = cur.lastrowid
+        for endpoint in ref.endpoints:
+            cur.execute('INSERT INTO endpoints (page_id, path) VALUES (?, ?)', (page_id, endpoint.path))
+            endpoint_id = cur.lastrowid
+            for section, params in [('Global path parameters', endpoint.global_path_parameters), ('Global query parameters', endpoint.global_query_parameters)]:
+                cur.executemany('INSERT INTO parameters VALUES (?, NULL, ?, ?, ?, ?)', [(endpoint_id, section, p.name, self.type_id(cur, p.type, None), self.text_id(cur, p.description.rstrip())) for p in params or []])
+            for method in endpoint.methods:
+                cur.execute('INSERT INTO methods (endpoint_id, method, description) VALUES (?, ?, ?)', (endpoint_id, method.method, method.description))
+                method_id = cur.lastrowid
+                for section, params in [('Query parameters', method.query_parameters), ('Body parameters', method.body_parameters)]:
+                    cur.executemany('INSERT INTO parameters VALUES (?, ?, ?, ?, ?, ?)', [(endpoint_id, method_id, section, p.name, self.type_id(cur, p.type, p.hyperlink), self.text_id(cur, p.description.rstrip())) for p in params or []])
+                cur.executemany('INSERT INTO responses VALUES (?, ?, ?)', [(method_id, r.code, self.type_id(cur, r.body, r.hyperlink)) for r in method.responses or []])
+
+    def close(self):
+        self.db.executescript("""
+            CREATE INDEX parameters_name ON parameters (name);
+            CREATE INDEX responses_type ON responses (type_id);
+            CREATE INDEX types_name ON types (name);
+        """)
+        self.db.commit()
+        self.db.close()
+
+def combine_pages(source, output, format, recover=False):
+    version = source.version
+    # pages of the same category are next to each other in the output
+    pages = sorted(read_index(source))
+    metadata = source_metadata(source)
+    writer = CombinedDatabase(output, metadata) if format == 'sqlite' else CombinedWorkbook(output, metadata)
+
+    failures = []
+    for file, title in pages:
+        print('=> ' + file)
+        try:
+            ref = parse_page(source.read('rest_api/' + file), version, file, recover)
+        except Exception as e:
+            print('   failed: {}: {}'.format(type(e).__name__, e))
+            failures.append(file)
+            continue
+        print_diagnostics(file, [dataclasses.asdict(d) for d in ref.diagnostics], indent='   ')
+        writer.add_page(file, title, ref)
+    writer.close()
 
-def build_csv(allapiref):
-    rows = []
-    rows.append([allapiref['url']])
-    rows.append([
-        'Endpoint',
-        'Section',
-        'Subsection',
-        'HTTP method',
-        'Global path parameters - Parameter',
-        'Global path parameters - Type',
-        'Global path parameters - Description',
-        'Global query parameters - Parameter',
-        'Global query parameters - Type',
-        'Global query parameters - Description',
-        'HTTP method - Query parameters - Parameter',
-        'HTTP method - Query parameters - Type',
-        'HTTP method - Query parameters - Description',
-        'HTTP method - Body parameters - Parameter',
-        'HTTP method - Body parameters - Type',
-        'HTTP method - Body parameters - Description',
-        'HTTP method - HTTP responses - HTTP code',
-        'HTTP method - HTTP responses - HTTP Response body',
-    ])
-    for apiref in allapiref['items']:
-        row = []
+    print('{} pages combined into {}, {} failed.'.format(len(pages) - len(failures), output, len(failures)))
+    return len(failures) == 0
 
-        sections = ['Global path parameters', 'Global query parameters', 'HTTP method']
-        for section in sections:
-            if section == 'Global path parameters' or section == 'Global query parameters':
-                if apiref.get(section):
-                    for item in apiref[section]:
-                        row.append(apiref['Endpoint'])
-                        row.append(section)
-                        row.append('') # subsection
-                        row.append('') # http method
-                        csv_indent_section(row, section)
-                        row.append(item['Parameter'])
-                        row.append(item['Type'])
-                        row.append(item['Description'])
-                        rows.append(row[:])
-                        row = []
-            else:
-                subsections = ['Query parameters', 'Body parameters', 'HTTP responses']
-                if apiref.get(section):
-                    for method in apiref[section]:
-                        for subsection in subsections:
-                            if method.get(subsection):
-                                for item in method[subsection]:
-                                    if subsection == 'Query parameters' or subsection == 'Body parameters':
-                                        row.append(apiref['Endpoint'])
-                                        row.append(section)
-                                        row.append(subsection)
-                                        row.append(method['Method'])
-                                        csv_indent_section(row, section)
-                                        csv_indent_subsection(row, subsection)
-                                        row.append(item['Parameter'])
-                                        row.append(item['Type'])
-                                        row.append(item['Description'])
-                                        rows.append(row[:])
-                                        row = []
-                                    elif subsection == 'HTTP responses':
-                                        row.append(apiref['Endpoint'])
-                                        row.append(section)
-                                        row.append(subsection)
-                                        row.append(method['Method'])
-                                        csv_indent_section(row, section)
-                                        csv_indent_subsection(row, subsection)
-                                        row.append(item['HTTP code'])
-                                        row.append(item['Response body'])
-                                        rows.append(row[:])
-                                        row = []
-    return rows
 
-def print_csv(allapiref, filename):
-    rows = build_csv(allapiref)
+# Diff of two openshift-docs trees. Pages, endpoints, methods, parameters and
+# responses are matched by dict keys (file, path, method, section and name,
+# HTTP code), so the cost is linear in the size of the pages.
+diff_columns = ['change', 'kind', 'page', 'endpoint', 'method', 'section', 'name', 'old', 'new']
 
-    if filename == '-' or filename == None:
-        f = sys.stdout
+def diff_parameters(change, section, old, new):
+    if old is None and new is None:
+        return
+    old = {p.name: p for p in old or []}
+    new = {p.name: p for p in new or []}
+    for name, p in new.items():
+        if name not in old:
+            change('added', 'parameter', section=section, name=name, new=p.type)
+        elif old[name].type != p.type:
+            change('changed', 'parameter', section=section, name=name, old=old[name].type, new=p.type)
+    for name, p in old.items():
+        if name not in new:
+            change('removed', 'parameter', section=section, name=name, old=p.type)
+
+def diff_responses(change, old, new):
+    old = {r.code: r for r in old or []}
+    new = {r.code: r for r in new or []}
+    for code, r in new.items():
+        if code not in old:
+            change('added', 'response', section='HTTP responses', name=code, new=r.body)
+        elif old[code].body != r.body:
+            change('changed', 'response', section='HTTP responses', name=code, old=old[code].body, new=r.body)
+    for code, r in old.items():
+        if code not in new:
+            change('removed', 'response', section='HTTP responses', name=code, old=r.body)
+
+def diff_page(file, old, new):
+    changes = []
+    def change(change, kind, **where):
+        d = dict.fromkeys(diff_columns, '')
+        d.update(change=change, kind=kind, page=file, **where)
+        changes.append(d)
+
+    if old is None or new is None:
+        change('added' if old is None else 'removed', 'page', new=new.title if new else '', old=old.title if old else '')
+        return changes
+
+    old_endpoints = {e.path: e for e in old.endpoints}
+    new_endpoints = {e.path: e for e in new.endpoints}
+    for path, e in new_endpoints.items():
+        o = old_endpoints.get(path)
+        if o is None:
+            change('added', 'endpoint', endpoint=path)
+            continue
+        endpoint_change = functools.partial(change, endpoint=path)
+        diff_parameters(endpoint_change, 'Global path parameters', o.global_path_parameters, e.global_path_parameters)
+        diff_parameters(endpoint_change, 'Global query parameters', o.global_query_parameters, e.global_query_parameters)
+
+        old_methods = {m.method: m for m in o.methods}
+        new_methods = {m.method: m for m in e.methods}
+        for name, m in new_methods.items():
+            om = old_methods.get(name)
+            if om is None:
+                endpoint_change('added', 'method', method=name)
+                continue
+            method_change = functools.partial(endpoint_change, method=name)
+            diff_parameters(method_change, 'Query parameters', om.query_parameters, m.query_parameters)
+            diff_parameters(method_change, 'Body parameters', om.body_parameters, m.body_parameters)
+            diff_responses(method_change, om.responses, m.responses)
+        for name in old_methods:
+            if name not in new_methods:
+                endpoint_change('removed', 'method', method=name)
+    for path in old_endpoints:
+        if path not in new_endpoints:
+            change('removed', 'endpoint', endpoint=path)
+    return changes
+
+# Returns (changes, error, diagnostics) of a page like convert_page(), where
+# the data of a side is None if the page isn't in its tree, or the exception
+# raised by reading it. Diagnostics are (side, diagnostic dicts).
+def diff_file(old_data, old_version, new_data, new_version, file, recover=False):
+    refs = {}
+    for side, data, version in [('old', old_data, old_version), ('new', new_data, new_version)]:
+        try:
+            if isinstance(data, Exception):
+                raise data # from the reader
+            refs[side] = None if data is None else parse_page(data, version, file, recover)
+        except Exception as e:
+            return [], '{}: {}: {}'.format(side, type(e).__name__, e), []
+    diagnostics = [(side, [dataclasses.asdict(d) for d in ref.diagnostics]) for side, ref in refs.items() if ref and ref.diagnostics]
+    return diff_page(file, refs['old'], refs['new']), None, diagnostics
+
+def read_or_error(source, file):
+    try:
+        return source.read('rest_api/' + file)
+    except OSError as e:
+        return e
+
+# Pages which fail on either side are listed in the report and left out of
+# the changes. Returns False if any failed.
+def diff_trees(old_source, new_source, format, output, jobs=1, recover=False):
+    import concurrent.futures
+    old_version = old_source.version
+    new_version = new_source.version
+    old_files = set(file for file, title in read_index(old_source))
+    new_files = set(file for file, title in read_index(new_source))
+    files = sorted(old_files | new_files)
+
+    # pages are parsed and compared one pair at a time
+    old_data = (read_or_error(old_source, file) if file in old_files else None for file in files)
+    new_data = (read_or_error(new_source, file) if file in new_files else None for file in files)
+    old_versions = [old_version] * len(files)
+    new_versions = [new_version] * len(files)
+    recovers = [recover] * len(files)
+    if jobs == 0:
+        jobs = os.cpu_count()
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(diff_file, old_data, old_versions, new_data, new_versions, files, recovers))
     else:
-        f = open(filename, 'w', newline='')
-
-    writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-    writer.writerows(rows)
-
-def color_cell(sheet, row, col, col_max, color):
-    for i in range(col, col_max + 1):
-        sheet.cell(row, i).fill = color
-
-def print_xlsx(title, allapiref, filename):
-    fill_endpoint = openpyxl.styles.PatternFill(patternType='solid', fgColor='D9EAD3')
-    fill_section = openpyxl.styles.PatternFill(patternType='solid', fgColor='FCE5CD')
-    fill_method = openpyxl.styles.PatternFill(patternType='solid', fgColor='CFE2F3')
-    fill_http = openpyxl.styles.PatternFill(patternType='solid', fgColor='FFF2CC')
-
-    book = openpyxl.Workbook()
-    # sheet = book.create_sheet(title)
-    sheet = book.active
-    sheet.title = 'Summary'
-    y = 1
-    for ep in allapiref['summary'].keys():
-        sheet.cell(y, 1, ep)
-        color_cell(sheet, y, 1, 3, fill_endpoint)
-        y = y + 1
-        for item in allapiref['summary'][ep]:
-            # sheet.cell(y, 2, item)
-            sheet.append(['', item['method'], item['description']])
-            y = y + 1
-    sheet.column_dimensions[openpyxl.utils.get_column_letter(3)].width = 90
-
-    sheet = book.create_sheet(title)
-
-    x = 1
-    y = 1
-    max_fill_x = 6
-    cell = sheet.cell(y, x, allapiref['url'])
-    cell.hyperlink = allapiref['url']
-    cell.style = "Hyperlink"
-    # color_cell(sheet, y, x, max_fill_x, fill_endpoint)
-    y = y + 1
-
-    for apiref in allapiref['items']:
-        sheet.cell(y, x, apiref['Endpoint'])
-        color_cell(sheet, y, 1, max_fill_x, fill_endpoint)
-        y = y + 1
-
-        for section in ['Global path parameters', 'Global query parameters']:
-            sheet.append(['', section, '', 'Parameter', 'Type', 'Description']) # header
-            color_cell(sheet, y, 2, max_fill_x, fill_section)
-            y = y + 1
-            if not apiref.get(section):
-                sheet.append(['', '', '', '-', '-', '-'])
-                y = y + 1
-            else:
-                for item in apiref[section]:
-                    sheet.append(['', '', '', item['Parameter'], item['Type'], item['Description'].rstrip()])
-                    y = y + 1
-
-        section = 'HTTP method'
-        sheet.append(['', section, 'Method', '', '', 'Description']) # header
-        color_cell(sheet, y, 2, max_fill_x, fill_section)
-        y = y + 1
-
-        for method in apiref[section]:
-            sheet.append(['', '', method['Method'], '', '', method['Description']])
-            color_cell(sheet, y, 3, max_fill_x, fill_method)
-            y = y + 1
-
-            for subsection in ['Query parameters','Body parameters']:
-                sheet.append(['', # Endpoint
-                              '', # Section
-                              '({}: {})'.format(method['Method'], subsection), # Method + Subsection
-                              'Parameter',
-                              'Type',
-                              'Description'])
-                color_cell(sheet, y, 3, max_fill_x, fill_http)
-                y = y + 1
-                if not method.get(subsection):
-                    sheet.append(['', '', '', '-', '-', '-'])
-                    y = y + 1
-                else:
-                    for item in method[subsection]:
-                        # sheet.append(['', '', '', item['Parameter'], item['Type'], item['Description']])
-                        sheet.cell(y, 4, item['Parameter'])
-                        t = item['Type']
-                        cell = sheet.cell(y, 5, t.get('value'))
-                        if t.get('hyperlink'):
-                            cell.hyperlink = t.get('hyperlink')
-                            cell.style = "Hyperlink"
-                        sheet.cell(y, 6, item['Description'].rstrip())
-                        y = y + 1
-
-            subsection = 'HTTP responses'
-            sheet.append(['', # Endpoint
-                          '', # Section
-                          '({}: {})'.format(method['Method'], subsection), # Method + Subsection
-                          'HTTP code',
-                          'Response body'])
-            color_cell(sheet, y, 3, max_fill_x, fill_http)
-            y = y + 1
-            if not method.get(subsection):
-                sheet.append(['', '', '', '-', '-'])
-                y = y + 1
-            else:
-                for item in method[subsection]:
-                    # sheet.append(['', '', '', item['HTTP code'], item['Response body']])
-                    sheet.cell(y, 4, item['HTTP code'])
-                    rb = item['Response body']
-                    cell = sheet.cell(y, 5, rb.get('value'))
-                    if rb.get('hyperlink'):
-                        cell.hyperlink = rb.get('hyperlink')
-                        cell.style = "Hyperlink"
-                    y = y + 1
-
-        sheet.append([''])
-        y = y + 1
-
-    sheet.column_dimensions[openpyxl.utils.get_column_letter(2)].width = 25
-    sheet.column_dimensions[openpyxl.utils.get_column_letter(3)].width = 30
-    sheet.column_dimensions[openpyxl.utils.get_column_letter(4)].width = 30
-    sheet.column_dimensions[openpyxl.utils.get_column_letter(5)].width = 20
-    sheet.column_dimensions[openpyxl.utils.get_column_letter(6)].width = 90
-    for col in sheet.iter_cols(min_col=6, max_col=6):
-        for cell in col:
-            cell.alignment = openpyxl.styles.Alignment(wrap_text=True)
-
-    sheet = book.create_sheet('Info')
-    commit_sha = subprocess.run("git show --format=oneline --no-patch | awk '{print $1'}", shell=True, capture_output=True, encoding='utf-8').stdout
-    sheet.cell(1, 1, 'This book is generated by adoc2xlsx.py at {}.'.format(datetime.datetime.today()))
-    sheet.cell(2, 1, 'The commit id of adoc2xlsx.py is: {}.'.format(commit_sha.rstrip()))
-    cell = sheet.cell(3, 1, 'https://github.com/orimanabu/openshift_rest_api_adoc2xlsx.git')
-    cell.hyperlink = 'https://github.com/orimanabu/openshift_rest_api_adoc2xlsx.git'
-    cell.style = "Hyperlink"
+        results = map(diff_file, old_data, old_versions, new_data, new_versions, files, recovers)
+    changes = []
+    failures = []
+    for file, (page_changes, error, diagnostics) in zip(files, results):
+        changes += page_changes
+        if error:
+            failures.append({'page': file, 'error': error})
+        # on stderr, as the report can be on stdout
+        for side, page_diagnostics in diagnostics:
+            print_diagnostics('{}:{}'.format(side, file), page_diagnostics, file=sys.stderr)
+
+    summary = {}
+    for change in changes:
+        key = '{} {}s'.format(change['change'], change['kind'])
+        summary[key] = summary.get(key, 0) + 1
+    if failures:
+        summary['failed pages'] = len(failures)
+    report = {
+        'old': {'repo': str(old_source), 'version': old_version},
+        'new': {'repo': str(new_source), 'version': new_version},
+        'summary': summary,
+        'changes': changes,
+        'failures': failures,
+    }
+    if format == 'xlsx':
+        print_diff_xlsx(report, output, source_metadata(new_source))
+    else:
+        print_json_dict(report, output)
+    for failure in failures:
+        print('Error: {}: {}'.format(failure['page'], failure['error']), file=sys.stderr)
+    return not failures
 
+def print_diff_xlsx(report, filename, metadata):
+    import openpyxl
     if filename == None:
         print("Error: needs '--output filename' when output format is xlsx.")
         exit(1)
+    fills = {
+        'added': openpyxl.styles.PatternFill(patternType='solid', fgColor='D9EAD3'),
+        'removed': openpyxl.styles.PatternFill(patternType='solid', fgColor='FCE5CD'),
+        'changed': openpyxl.styles.PatternFill(patternType='solid', fgColor='FFF2CC'),
+    }
+    fill_header = openpyxl.styles.PatternFill(patternType='solid', fgColor='CFE2F3')
+
+    book = openpyxl.Workbook(write_only=True)
+    rows = RowWriter()
+    sheet = book.create_sheet('Summary')
+    sheet.column_dimensions['A'].width = 30
+    for side in ['old', 'new']:
+        rows.append(sheet, [side, report[side]['repo'], report[side]['version']])
+    rows.append(sheet, [])
+    for key in sorted(report['summary']):
+        rows.append(sheet, [key, report['summary'][key]])
+    if report['failures']:
+        rows.append(sheet, [])
+        rows.append(sheet, ['Failed pages'], 2, fill_header)
+        for failure in report['failures']:
+            rows.append(sheet, [failure['page'], failure['error']])
+
+    sheet = book.create_sheet('Changes')
+    for i, width in enumerate([10, 10, 45, 60, 10, 25, 30, 30, 30]):
+        sheet.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = width
+    rows.append(sheet, [c.capitalize() for c in diff_columns], len(diff_columns), fill_header)
+    for change in report['changes']:
+        rows.append(sheet, [change[c] for c in diff_columns], 2, fills[change['change']])
+    set_properties(book, metadata, 'OpenShift REST API changes from {} to {}'.format(report['old']['version'], report['new']['version']))
     book.save(filename)
 
-def print_json(allapiref, filename):
-    if filename == '-' or filename == None:
-        print(json.dumps(allapiref))
-    else:
-        with open(filename, 'w') as f:
-            f.write(json.dumps(allapiref))
 
-
-allapiref = {}
 if __name__ == '__main__':
     # print(sys.argv)
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('adoc', help='adoc path')
-    parser.add_argument('-f', '--format', default='json', choices=['json', 'csv', 'xlsx'], help='output format')
-    parser.add_argument('-o', '--output', help='output file name')
-    parser.add_argument('-d', '--debug', action='store_true')
+    parser.add_argument('adoc', help='adoc path, or openshift-docs repo directory with --batch or --combine')
+    parser.add_argument('-f', '--format', default='json', choices=list(writers) + ['sqlite'], help='output format (sqlite: only with --combine)')
+    parser.add_argument('-o', '--output', help='output file name, or output directory with --batch')
+    parser.add_argument('--stream', action='store_true', help='write xlsx with write-only worksheets to reduce memory usage')
+    parser.add_argument('--outline', action='store_true', help='group the rows of each endpoint and method in xlsx, so they can be collapsed')
+    parser.add_argument('--ndjson-unit', default='endpoint', choices=['endpoint', 'method'], help='one ndjson record per endpoint or per method')
+    parser.add_argument('--fast-json', action='store_true', help='serialize json and ndjson with orjson if it is installed')
+    parser.add_argument('-b', '--batch', action='store_true', help='convert all pages listed in rest_api/index.adoc')
+    parser.add_argument('-c', '--combine', action='store_true', help='write all pages listed in rest_api/index.adoc to one xlsx or sqlite file')
+    parser.add_argument('--diff', metavar='OLD_REPODIR', help='compare the openshift-docs repo directory OLD_REPODIR with adoc, and write the changes in json or xlsx')
+    parser.add_argument('-r', '--ref', help='read the openshift-docs repo from this git ref (e.g. enterprise-4.9) instead of the working tree')
+    parser.add_argument('--old-ref', help='git ref of OLD_REPODIR with --diff')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes in batch and diff mode (0: number of CPUs)')
+    parser.add_argument('--pipeline', metavar='DEPTH', type=int, default=0, help='with --batch and -j 1, read, convert and save pages in overlapping stages with up to DEPTH pages queued between them (0: one page after the other)')
+    parser.add_argument('--force', action='store_true', help='rebuild all pages in batch mode even if they are up to date')
+    parser.add_argument('--recover', action='store_true', help='leave out malformed tables instead of failing the page, and report them with their line numbers')
+    parser.add_argument('-w', '--watch', action='store_true', help='with --batch, keep running and convert pages again when they change')
+    parser.add_argument('--debounce', type=float, default=0.2, help='seconds without changes before converting again in watch mode (default: 0.2)')
+    parser.add_argument('--poll', action='store_true', help='poll for changes in watch mode instead of using inotify')
+    parser.add_argument('-d', '--debug', action='store_true', help='print trace records of the parser as JSON lines')
+    parser.add_argument('--profile', action='store_true', help='print the wall time, CPU time and counts of each stage (read, tokenize, parse, model, metadata, render, serialize, save) to stderr')
+    parser.add_argument('--profile-memory', action='store_true', help='also measure the memory allocated by each stage with tracemalloc, which is several times slower (implies --profile)')
+    parser.add_argument('--profile-json', metavar='FILE', help='write the --profile results of each page and their totals as json (implies --profile)')
+    parser.add_argument('--profile-pstats', metavar='FILE', help='write cProfile stats of the conversion, for pstats or snakeviz (implies --profile)')
     args = parser.parse_args()
 
-    sh = logging.StreamHandler(stream=sys.stdout)
+    # on stderr, so traces never mix with json or ndjson written to stdout
+    sh = logging.StreamHandler(stream=sys.stderr)
     # sh.setLevel(logging.WARNING)
-    logger = logging.getLogger('xxx')
     if args.debug:
-        logger.setLevel(logging.INFO)
+        enable_trace()
     logger.addHandler(sh)
-
-    file = open(args.adoc, 'r')
-    ocp_version, allapiref['url'] = adoc_path2url(args.adoc)
-    logger.info("** ocp_version: " + ocp_version)
-    allapiref['items'] = []
-
-    title = ''
-
-    apiref = {}
-    endpoint = ''
-    mode = ''
-    prev = ''
-    summary = False
-    for line in file:
-        logger.info('?? ' + line.rstrip())
-        if prev:
-            line = prev
-            prev = ''
-        if line.startswith('= '):
-            m = re.search(r'^= (.*) \[.*$', line)
-            title = m.group(1)
-        elif line.startswith('== API endpoints'):
-            summary = True
-            allapiref['summary'] = {}
-            logger.info('** summary start')
-        elif summary and line.startswith('* '):
-            m = re.search(r'^\* `(.*)`', line)
-            endpoint = m.group(1)
-            allapiref['summary'][endpoint] = []
-            logger.info('** summary endpoint: ' + endpoint)
-        elif summary and line.startswith('- '):
-            m = re.search(r'^- `(.*)`: (.*)', line.rstrip())
-            method = m.group(1)
-            desc = m.group(2)
-            allapiref['summary'][endpoint].append({'method': method, 'description': desc})
-            logger.info('** summary method: ' + method)
-        elif line.startswith('=== /api'):
-            summary = False
-            m = re.search(r'^=== (.*)$', line.rstrip())
-            endpoint = m.group(1)
-            logger.info('** endpoint: {}'.format(endpoint))
-            if apiref.get('Endpoint'):
-                logger.info("** allapiref['items'].append(): {}".format(apiref.get('Endpoint')))
-                allapiref['items'].append(apiref)
-                apiref = {}
-            apiref['Endpoint'] = endpoint
-        elif line.startswith('.Global path parameters'):
-            parse_global_path_parameters(file)
-        elif line.startswith('.Global query parameters'):
-            parse_global_query_parameters(file)
-        elif line.startswith('HTTP method::'):
-            prev = parse_http_method(file)
-
-
-    logger.info("** allapiref['items].append(): {}".format(apiref.get('Endpoint')))
-    allapiref['items'].append(apiref)
-
-    if args.format == 'csv':
-        print_csv(allapiref, args.output)
-    elif args.format == 'xlsx':
-        print_xlsx(title, allapiref, args.output)
+    options = OutputOptions(stream=args.stream, outline=args.outline, ndjson_unit=args.ndjson_unit, fast_json=args.fast_json, recover=args.recover)
+    if args.profile or args.profile_memory or args.profile_json or args.profile_pstats:
+        if args.diff or args.combine:
+            print("Error: --profile is only available for a single page and with --batch.")
+            exit(1)
+        enable_profile(args.profile_memory)
+        if args.profile_pstats:
+            import cProfile
+            cprofile = cProfile.Profile()
+            cprofile.enable()
+    ok = True
+
+    if args.diff:
+        if args.format not in ['json', 'xlsx']:
+            print("Error: --diff writes json or xlsx.")
+            exit(1)
+        if not diff_trees(open_source(args.diff, args.old_ref), open_source(args.adoc, args.ref), args.format, args.output, args.jobs, args.recover):
+            exit(1)
+    elif args.combine:
+        if args.output == None or args.format not in ['xlsx', 'sqlite']:
+            print("Error: needs '-f xlsx' or '-f sqlite' and '--output filename' with --combine.")
+            exit(1)
+        if not combine_pages(open_source(args.adoc, args.ref), args.output, args.format, args.recover):
+            exit(1)
+    elif args.format == 'sqlite':
+        print("Error: '-f sqlite' is only available with --combine.")
+        exit(1)
+    elif args.batch:
+        if args.output == None:
+            print("Error: needs '--output directory' in batch mode.")
+            exit(1)
+        if args.watch:
+            if args.ref:
+                print("Error: --watch watches the working tree, and can't be used with --ref.")
+                exit(1)
+            watch_batch(open_source(args.adoc), args.output, args.format, args.jobs, args.force, options, args.debounce, args.poll, args.pipeline)
+        else:
+            ok = batch_convert(open_source(args.adoc, args.ref), args.output, args.format, args.jobs, args.force, options, pipeline=args.pipeline)
     else:
-        print_json(allapiref, args.output)
+        try:
+            diagnostics = convert(args.adoc, args.format, args.output, options=options)
+        except ParseError as e:
+            print("Error: {}: {} (--recover leaves it out)".format(args.adoc, e))
+            exit(1)
+        print_diagnostics(args.adoc, [dataclasses.asdict(d) for d in diagnostics], file=sys.stderr)
+
+    if profiler:
+        if args.profile_pstats:
+            cprofile.disable()
+            cprofile.dump_stats(args.profile_pstats)
+        if args.profile_json:
+            with open(args.profile_json, 'w') as f:
+                json.dump(profiler.to_dict(), f, indent=2)
+        profiler.report(sys.stderr)
+    if not ok:
+        exit(1)
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+
+# Benchmarks for adoc2xlsx.py.
+#
+#   ./bench.py xlsx                    # synthetic page
+#   ./bench.py table --rows 10000 20000 40000
+#   ./bench.py trace --endpoints 100
+#   ./bench.py lexer --repodir ../openshift-docs --rev HEAD~1
+#   ./bench.py startup --rev HEAD~1
+#   ./bench.py corpus /tmp/openshift-docs --pages 50
+#   ./bench.py suite --save-baseline baseline.json
+#   ./bench.py suite --baseline baseline.json
+#   ./bench.py xlsx --adoc ../openshift-docs/rest_api/extension_apis/customresourcedefinition-apiextensions-k8s-io-v1.adoc
+
+import io
+import os
+import re
+import sys
+import html
+import json
+import logging
+import time
+import types
+import contextlib
+import argparse
+import tempfile
+import subprocess
+
+import adoc2xlsx
+
+version = '4.8'
+metadata = adoc2xlsx.RunMetadata('bench', 0, version=version)
+
+def synth_table(rows, cols=3, xref=False):
+    lines = []
+    if cols == 3:
+        lines.append('[cols="1,1,2",options="header"]')
+        lines.append('|===')
+        lines.append('| Parameter | Type | Description')
+        for i in range(rows):
+            lines.append('| `param{}`'.format(i))
+            if xref and i % 3 == 0:
+                lines.append('| xref:../objects/index.adoc#io.k8s.api.core.v1.Type{}[`Type{}`]'.format(i % 50, i % 50))
+            else:
+                lines.append('| `string`')
+            lines.append('| Description of param{} with &quot;quoted&quot; text.'.format(i))
+            if i % 5 == 0:
+                lines.append('')
+                lines.append('Second paragraph of param{}.'.format(i))
+    else:
+        lines.append('[cols="1,1",options="header"]')
+        lines.append('|===')
+        lines.append('| HTTP code | Reponse body')
+        for i in range(rows):
+            lines.append('| {} - OK'.format(200 + i))
+            lines.append('| xref:../objects/index.adoc#io.k8s.api.core.v1.Status[`Status`] schema')
+    lines.append('|===')
+    return lines
+
+def synth_page(endpoints=20, params=50):
+    methods = ['GET', 'PUT', 'POST', 'DELETE', 'PATCH']
+    lines = ['= Synthetic [v1]', '', '== API endpoints', '']
+    for e in range(endpoints):
+        lines.append('* `/api/v1/namespaces/{{namespace}}/things{}`'.format(e))
+        for method in methods:
+            lines.append('- `{}`: {} things{}'.format(method, method.lower(), e))
+    lines.append('')
+    for e in range(endpoints):
+        lines += ['', '=== /api/v1/namespaces/{{namespace}}/things{}'.format(e), '']
+        lines.append('.Global path parameters')
+        lines += synth_table(2)
+        lines += ['', '.Global query parameters']
+        lines += synth_table(5)
+        for method in methods:
+            lines += ['', 'HTTP method::', '  `{}`'.format(method), '', 'Description::', '  {} things{}'.format(method.lower(), e), '']
+            lines.append('.Query parameters')
+            lines += synth_table(params // 5, xref=True)
+            lines += ['', '.Body parameters']
+            lines += synth_table(params, xref=True)
+            lines += ['', '.HTTP responses']
+            lines += synth_table(3, cols=2)
+    return '\n'.join(lines) + '\n'
+
+categories = ['workloads_apis', 'network_apis', 'storage_apis', 'extension_apis']
+
+# Writes an openshift-docs like tree to repodir: .git/HEAD of an
+# enterprise-<version> branch, rest_api/index.adoc and the pages, which
+# range from a few endpoints with small tables to pages with huge body
+# parameter tables.
+def synth_corpus(repodir, pages=20):
+    os.makedirs(os.path.join(repodir, '.git'), exist_ok=True)
+    with open(os.path.join(repodir, '.git', 'HEAD'), 'w') as f:
+        f.write('ref: refs/heads/enterprise-{}\n'.format(version))
+    index = ['[id="api-index"]', '= API index', '']
+    for c, category in enumerate(categories):
+        os.makedirs(os.path.join(repodir, 'rest_api', category), exist_ok=True)
+        index += ['== {}'.format(category), '']
+        for i in range(c, pages, len(categories)):
+            name = 'thing{}-v1'.format(i)
+            with open(os.path.join(repodir, 'rest_api', category, name + '.adoc'), 'w') as f:
+                f.write(synth_page(1 + i % 4 * 2, [10, 40, 300][i % 3]).replace('Synthetic', 'Thing{}'.format(i)))
+            index.append('* xref:./{}/{}.adoc#{}[Thing{}]'.format(category, name, name, i))
+        index.append('')
+    with open(os.path.join(repodir, 'rest_api', 'index.adoc'), 'w') as f:
+        f.write('\n'.join(index) + '\n')
+
+def bench_corpus(args):
+    synth_corpus(args.repodir, args.pages)
+    print('Wrote {} pages to {}'.format(args.pages, args.repodir))
+
+# parse_table before the single pass rewrite: string concatenation, re.split
+# and draining the cells with pop(0)
+def legacy_parse_table(file):
+    for line in file:
+        if line.startswith('[cols='):
+            continue
+        if line.startswith('|==='):
+            line = file.readline()
+            break
+
+    table_str = ''
+    for line in file:
+        if line.startswith('|==='):
+            break
+        table_str = table_str + html.unescape(line)
+
+    array = re.split(r'\|[ \n]', table_str)
+    array.pop(0)
+    rows = []
+    while array:
+        rows.append(adoc2xlsx.http_method_parameter([array.pop(0), array.pop(0), array.pop(0)], version))
+    return rows
+
+def bench_table(args):
+    print('{:>8} {:>12} {:>12} {:>8}'.format('rows', 'legacy (s)', 'single (s)', 'speedup'))
+    for rows in args.rows:
+        text = '\n'.join(synth_table(rows, xref=True)) + '\n'
+        times = []
+        for parse in [legacy_parse_table, lambda file: adoc2xlsx.table_rows(file.readlines()[3:-1], lambda row: adoc2xlsx.http_method_parameter(row, version))]:
+            best = None
+            for i in range(args.repeat):
+                file = io.StringIO(text)
+                start = time.perf_counter()
+                result = parse(file)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            times.append(best)
+            if len(times) == 1:
+                expected = result
+            elif result != expected:
+                print('Error: results differ for {} rows'.format(rows))
+                exit(1)
+        print('{:8} {:12.4f} {:12.4f} {:7.1f}x'.format(rows, times[0], times[1], times[0] / times[1]))
+
+def page_path(args, tmpdir):
+    if args.adoc:
+        return args.adoc
+    path = os.path.join(tmpdir, 'synthetic.adoc')
+    with open(path, 'w') as f:
+        f.write(synth_page(args.endpoints, args.params))
+    return path
+
+def time_parse(adoc, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        adoc2xlsx.parse_adoc(adoc, version, 'https://example.com/')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_trace(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        adoc = page_path(args, tmpdir)
+        off = time_parse(adoc, args.repeat)
+
+        with open(os.devnull, 'w') as devnull:
+            handler = logging.StreamHandler(devnull)
+            adoc2xlsx.logger.addHandler(handler)
+            adoc2xlsx.enable_trace()
+            on = time_parse(adoc, args.repeat)
+            adoc2xlsx.tracing = False
+            adoc2xlsx.logger.setLevel(logging.NOTSET)
+            adoc2xlsx.logger.removeHandler(handler)
+
+    print('{:10} {:>10}'.format('debug', 'parse (s)'))
+    print('{:10} {:10.4f}'.format('off', off))
+    print('{:10} {:10.4f}'.format('on', on))
+
+# adoc2xlsx.py as of a git revision of this repo, e.g. to compare the parser
+# with the previous one
+def load_revision(rev):
+    source = subprocess.run(['git', 'show', '{}:adoc2xlsx.py'.format(rev)], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, encoding='utf-8', check=True).stdout
+    module = types.ModuleType('adoc2xlsx_{}'.format(rev))
+    module.__file__ = adoc2xlsx.__file__
+    exec(compile(source, '{}:adoc2xlsx.py'.format(rev), 'exec'), module.__dict__)
+    return module
+
+# the pages in rest_api/index.adoc of a docs tree, or the synthetic page
+def read_pages(args):
+    if not args.repodir:
+        return [('synthetic.adoc', synth_page(args.endpoints, args.params))]
+    source = adoc2xlsx.open_source(args.repodir)
+    pages = [(file, source.read('rest_api/' + file).decode('utf-8')) for file, title in adoc2xlsx.read_index(source)]
+    source.close()
+    return pages
+
+def bench_lexer(args):
+    pages = read_pages(args)
+    lines = sum(text.count('\n') for file, text in pages)
+    print('{} pages, {} lines'.format(len(pages), lines))
+    print('{:12} {:>10} {:>14}'.format('parser', 'seconds', 'lines/sec'))
+    for name, module in [(args.rev, load_revision(args.rev)), ('current', adoc2xlsx)]:
+        best = None
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            for file, text in pages:
+                module.parse_adoc(io.StringIO(text), version, 'https://example.com/')
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('{:12} {:10.3f} {:14.0f}'.format(name, best, lines / best))
+
+# Sum of the cumulative import times of the top-level imports of a
+# "python -X importtime" run, in microseconds.
+def import_time(stderr):
+    total = 0
+    for line in stderr.splitlines():
+        m = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\S.*)$', line)
+        if m and not m.group(2).startswith(' '):
+            total += int(m.group(1))
+    return total
+
+def time_command(argv, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_startup(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        repodir = os.path.join(tmpdir, 'openshift-docs')
+        synth_corpus(repodir, 1)
+        adoc = args.adoc or os.path.join(repodir, 'rest_api', categories[0], 'thing0-v1.adoc')
+        old = os.path.join(tmpdir, 'adoc2xlsx_old.py')
+        with open(old, 'w') as f:
+            f.write(subprocess.run(['git', 'show', '{}:adoc2xlsx.py'.format(args.rev)], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, encoding='utf-8', check=True).stdout)
+
+        print('{:12} {:>12} {:>10} {:>10} {:>10} {:>10}'.format('script', 'imports (ms)', '--help', 'json', 'csv', 'xlsx'))
+        for name, script in [(args.rev, old), ('current', adoc2xlsx.__file__)]:
+            proc = subprocess.run([sys.executable, '-X', 'importtime', script, adoc, '-f', 'json', '-o', os.path.join(tmpdir, 'out.json')], capture_output=True, encoding='utf-8', check=True)
+            times = [time_command([script, '--help'], args.repeat)]
+            for format in ['json', 'csv', 'xlsx']:
+                times.append(time_command([script, adoc, '-f', format, '-o', os.path.join(tmpdir, 'out.' + format)], args.repeat))
+            print('{:12} {:12.1f} {}'.format(name, import_time(proc.stderr) / 1000, ' '.join('{:8.1f}ms'.format(t * 1000) for t in times)))
+
+def run_child(argv):
+    # returns the child's JSON result and its peak RSS in KiB
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv, stdout=subprocess.PIPE)
+    out = proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        print('Error: child failed: {}'.format(argv))
+        exit(1)
+    return json.loads(out), rusage.ru_maxrss
+
+def child_xlsx(args):
+    ref = adoc2xlsx.parse_adoc(args.adoc, version, 'https://example.com/')
+    start = time.perf_counter()
+    if args.writer == 'default':
+        adoc2xlsx.print_xlsx(ref, args.output, metadata)
+    elif args.writer == 'stream':
+        adoc2xlsx.print_xlsx_stream(ref, args.output, metadata)
+    print(json.dumps({'seconds': time.perf_counter() - start}))
+
+def bench_xlsx(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        adoc = page_path(args, tmpdir)
+        output = os.path.join(tmpdir, 'out.xlsx')
+        print('{:10} {:>10} {:>14}'.format('writer', 'seconds', 'peak RSS (MiB)'))
+        # 'none' only parses the page, as the baseline of the peak RSS
+        for writer in ['none', 'default', 'stream']:
+            best, rss = None, 0
+            for i in range(args.repeat):
+                result, maxrss = run_child(['_xlsx', writer, adoc, output])
+                best = result['seconds'] if best is None else min(best, result['seconds'])
+                rss = max(rss, maxrss)
+            print('{:10} {:10.3f} {:14.1f}'.format(writer, best, rss / 1024))
+
+suite_stages = ['startup', 'parse', 'table', 'json', 'csv', 'xlsx', 'xlsx-stream', 'batch']
+
+# Runs one stage of the suite and prints its wall time. Everything but the
+# stage itself (parsing the page for the writers) is done before the clock
+# starts, but counts in the peak RSS.
+def child_stage(args):
+    if args.stage == 'table':
+        lines = synth_table(40000, xref=True)[3:-1]
+        lines = [line + '\n' for line in lines]
+        record = lambda row: adoc2xlsx.http_method_parameter(row, version)
+    elif args.stage not in ['startup', 'parse', 'batch']:
+        ref = adoc2xlsx.parse_adoc(args.input, version, 'https://example.com/')
+    start = time.perf_counter()
+    if args.stage == 'startup':
+        # a whole json conversion of a small page
+        subprocess.run([sys.executable, adoc2xlsx.__file__, args.input, '-f', 'json', '-o', args.output], check=True)
+    elif args.stage == 'parse':
+        adoc2xlsx.parse_adoc(args.input, version, 'https://example.com/')
+    elif args.stage == 'table':
+        adoc2xlsx.table_rows(lines, record)
+    elif args.stage == 'json':
+        adoc2xlsx.print_json(ref, args.output)
+    elif args.stage == 'csv':
+        adoc2xlsx.print_csv(ref, args.output)
+    elif args.stage == 'xlsx':
+        adoc2xlsx.print_xlsx(ref, args.output, metadata)
+    elif args.stage == 'xlsx-stream':
+        adoc2xlsx.print_xlsx_stream(ref, args.output, metadata)
+    elif args.stage == 'batch':
+        source = adoc2xlsx.open_source(args.input)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = adoc2xlsx.batch_convert(source, args.output, 'xlsx', force=True)
+        source.close()
+        if not ok:
+            exit(1)
+    print(json.dumps({'seconds': time.perf_counter() - start}))
+
+def run_suite(args, tmpdir):
+    repodir = args.repodir
+    if not repodir:
+        # in a child, as the peak RSS of this process is inherited by the
+        # children of the stages
+        repodir = os.path.join(tmpdir, 'openshift-docs')
+        subprocess.run([sys.executable, os.path.abspath(__file__), 'corpus', repodir, '--pages', str(args.pages)], stdout=subprocess.DEVNULL, check=True)
+    source = adoc2xlsx.open_source(repodir)
+    pages = [os.path.join(repodir, 'rest_api', file) for file, title in adoc2xlsx.read_index(source)]
+    source.close()
+    adoc = args.adoc or max(pages, key=os.path.getsize)
+
+    results = {}
+    for stage in args.stages:
+        if stage == 'batch':
+            input, output = repodir, os.path.join(tmpdir, 'batch')
+        elif stage == 'startup':
+            input, output = min(pages, key=os.path.getsize), os.path.join(tmpdir, 'out.json')
+        else:
+            input, output = adoc, os.path.join(tmpdir, 'out.' + stage.split('-')[0])
+        best, rss = None, 0
+        for i in range(args.repeat):
+            result, maxrss = run_child(['_stage', stage, input, output])
+            best = result['seconds'] if best is None else min(best, result['seconds'])
+            rss = max(rss, maxrss)
+        results[stage] = {'seconds': best, 'rss': rss}
+    return results
+
+# Returns the names of the stages which are slower or use more memory than
+# in the baseline by more than tolerance (0.25 = 25%).
+def compare_baseline(results, baseline, tolerance):
+    regressions = []
+    print('{:12} {:>9} {:>9} {:>7} {:>10} {:>10} {:>7}'.format('stage', 'seconds', 'baseline', '', 'RSS (MiB)', 'baseline', ''))
+    for stage, result in results.items():
+        base = baseline.get(stage)
+        if base is None:
+            print('{:12} {:9.3f} {:>9} {:>7} {:10.1f}'.format(stage, result['seconds'], '-', '', result['rss'] / 1024))
+            continue
+        time_ratio = result['seconds'] / base['seconds']
+        rss_ratio = result['rss'] / base['rss']
+        mark = ''
+        if time_ratio > 1 + tolerance or rss_ratio > 1 + tolerance:
+            regressions.append(stage)
+            mark = '  REGRESSION'
+        print('{:12} {:9.3f} {:9.3f} {:6.2f}x {:10.1f} {:10.1f} {:6.2f}x{}'.format(stage, result['seconds'], base['seconds'], time_ratio, result['rss'] / 1024, base['rss'] / 1024, rss_ratio, mark))
+    return regressions
+
+def bench_suite(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = run_suite(args, tmpdir)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print('Error: regression in {}'.format(', '.join(regressions)))
+        exit(1)
+
+# Drops the page cache (needs root), so that the corpus is read from and the
+# outputs written to the disk itself.
+def drop_caches():
+    os.sync()
+    try:
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+def bench_pipeline(args):
+    print('{:6} {:>6} {:>9} {:>10}  {}'.format('fs', 'depth', 'seconds', 'RSS (MiB)', 'cache'))
+    for fs, topdir in [('disk', args.disk), ('tmpfs', args.tmpfs)]:
+        with tempfile.TemporaryDirectory(dir=topdir) as tmpdir:
+            repodir = os.path.join(tmpdir, 'openshift-docs')
+            subprocess.run([sys.executable, os.path.abspath(__file__), 'corpus', repodir, '--pages', str(args.pages)], stdout=subprocess.DEVNULL, check=True)
+            output = os.path.join(tmpdir, 'out')
+            argv = [sys.executable, adoc2xlsx.__file__, '--batch', repodir, '-f', args.format, '-o', output, '--force'] + (['--stream'] if args.stream else [])
+            for depth in [0] + args.depth:
+                best, rss = None, 0
+                for i in range(args.repeat):
+                    cold = fs == 'disk' and drop_caches()
+                    start = time.perf_counter()
+                    proc = subprocess.Popen(argv + ['--pipeline', str(depth)], stdout=subprocess.DEVNULL)
+                    _, status, rusage = os.wait4(proc.pid, 0)
+                    elapsed = time.perf_counter() - start
+                    if os.waitstatus_to_exitcode(status) != 0:
+                        print('Error: batch failed: {}'.format(argv))
+                        exit(1)
+                    best = elapsed if best is None else min(best, elapsed)
+                    rss = max(rss, rusage.ru_maxrss)
+                print('{:6} {:>6} {:9.3f} {:10.1f}  {}'.format(fs, depth or '-', best, rss / 1024, 'cold' if cold else 'warm'))
+
+def add_page_arguments(p):
+    p.add_argument('--adoc', help='adoc page (default: synthetic page)')
+    p.add_argument('--endpoints', type=int, default=20, help='endpoints in the synthetic page')
+    p.add_argument('--params', type=int, default=50, help='body parameters per method in the synthetic page')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('table', help='compare table parsers on synthetic tables')
+    p.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 40000])
+    p.add_argument('-n', '--repeat', type=int, default=3)
+    p.set_defaults(func=bench_table)
+
+    p = subparsers.add_parser('trace', help='compare parse time with --debug on and off')
+    add_page_arguments(p)
+    p.add_argument('-n', '--repeat', type=int, default=3)
+    p.set_defaults(func=bench_trace)
+
+    p = subparsers.add_parser('lexer', help='compare the page parser with the one of a git revision (lines/sec)')
+    add_page_arguments(p)
+    p.add_argument('--repodir', help='parse the pages of an openshift-docs checkout (default: synthetic page)')
+    p.add_argument('--rev', default='HEAD', help='git revision of adoc2xlsx.py to compare with (default: HEAD)')
+    p.add_argument('-n', '--repeat', type=int, default=3)
+    p.set_defaults(func=bench_lexer)
+
+    p = subparsers.add_parser('xlsx', help='compare xlsx writers (wall time and peak RSS)')
+    add_page_arguments(p)
+    p.add_argument('-n', '--repeat', type=int, default=3)
+    p.set_defaults(func=bench_xlsx)
+
+    p = subparsers.add_parser('startup', help='compare the import time and the run time of small conversions with a git revision')
+    p.add_argument('--adoc', help='page in an openshift-docs checkout (default: small synthetic page)')
+    p.add_argument('--rev', default='HEAD', help='git revision of adoc2xlsx.py to compare with (default: HEAD)')
+    p.add_argument('-n', '--repeat', type=int, default=5)
+    p.set_defaults(func=bench_startup)
+
+    p = subparsers.add_parser('corpus', help='write a synthetic openshift-docs tree')
+    p.add_argument('repodir')
+    p.add_argument('--pages', type=int, default=20)
+    p.set_defaults(func=bench_corpus)
+
+    p = subparsers.add_parser('suite', help='time and measure the peak RSS of parse, table, writers and batch, and compare with a baseline')
+    p.add_argument('--repodir', help='docs tree for the batch stage (default: synthetic corpus)')
+    p.add_argument('--adoc', help='page for the other stages (default: the largest page of the docs tree)')
+    p.add_argument('--pages', type=int, default=20, help='pages in the synthetic corpus')
+    p.add_argument('--stages', nargs='+', choices=suite_stages, default=suite_stages)
+    p.add_argument('--save-baseline', metavar='FILE', help='save the results as the baseline')
+    p.add_argument('--baseline', metavar='FILE', help='exit 1 if a stage is slower or uses more memory than in the baseline')
+    p.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline (default: 0.25)')
+    p.add_argument('-n', '--repeat', type=int, default=3)
+    p.set_defaults(func=bench_suite)
+
+    p = subparsers.add_parser('pipeline', help='compare batch runs with --pipeline and one page after the other, on disk and on tmpfs')
+    p.add_argument('--pages', type=int, default=30, help='pages in the synthetic corpus')
+    p.add_argument('--depth', type=int, nargs='+', default=[1, 2, 4], help='--pipeline depths to compare with 0')
+    p.add_argument('-f', '--format', default='xlsx', choices=['json', 'ndjson', 'csv', 'xlsx'])
+    p.add_argument('--stream', action='store_true', help='write xlsx with --stream')
+    p.add_argument('--disk', default=None, help='directory on disk for the corpus and the outputs (default: the temporary directory)')
+    p.add_argument('--tmpfs', default='/dev/shm', help='directory on tmpfs (default: /dev/shm)')
+    p.add_argument('-n', '--repeat', type=int, default=3)
+    p.set_defaults(func=bench_pipeline)
+
+    p = subparsers.add_parser('_stage')
+    p.add_argument('stage', choices=suite_stages)
+    p.add_argument('input')
+    p.add_argument('output')
+    p.set_defaults(func=child_stage)
+
+    p = subparsers.add_parser('_xlsx')
+    p.add_argument('writer')
+    p.add_argument('adoc')
+    p.add_argument('output')
+    p.set_defaults(func=child_xlsx)
+
+    args = parser.parse_args()
+    args.func(args)
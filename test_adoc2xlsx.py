@@ -0,0 +1,104 @@
+import io
+
+import pytest
+
+import adoc2xlsx
+
+# A page with two endpoints; {query} is the table of the global query
+# parameters of the first one, {responses} the one of its GET responses.
+page = '''= Pod [core/v1]
+
+=== /api/v1/pods
+
+.Global query parameters
+{query}
+
+HTTP method::
+  `GET`
+
+Description::
+  list or watch objects of kind Pod
+
+.HTTP responses
+[cols="1,1",options="header"]
+|===
+| HTTP code | Reponse body
+| 200 - OK
+| xref:../objects/index.adoc#io.k8s.api.core.v1.PodList[`PodList`] schema
+| 401 - Unauthorized
+| Empty
+{responses_end}
+
+=== /api/v1/namespaces/{{namespace}}/pods/{{name}}
+
+.Global path parameters
+[cols="1,1,2",options="header"]
+|===
+| Parameter | Type | Description
+| `name`
+| `string`
+| name of the Pod
+|===
+'''
+
+query_table = '''[cols="1,1,2",options="header"]
+|===
+| Parameter | Type | Description
+| `continue`
+| `string`
+| The continue option.
+|==='''
+
+def parse(text, recover=False):
+    return adoc2xlsx.parse_adoc(io.StringIO(text), '4.8', 'url', recover)
+
+def test_page():
+    ref = parse(page.format(query=query_table, responses_end='|==='))
+    assert [e.path for e in ref.endpoints] == ['/api/v1/pods', '/api/v1/namespaces/{namespace}/pods/{name}']
+    assert [p.name for p in ref.endpoints[0].global_query_parameters] == ['continue']
+    assert [r.code for r in ref.endpoints[0].methods[0].responses] == ['200 - OK', '401 - Unauthorized']
+    assert ref.diagnostics == []
+
+# a caption without a table, followed by the next section
+def test_missing_table():
+    text = page.format(query='', responses_end='|===')
+    with pytest.raises(adoc2xlsx.ParseError, match='^line 8: Global query parameters table: no table after the caption'):
+        parse(text)
+    ref = parse(text, recover=True)
+    assert [(d.line, d.severity) for d in ref.diagnostics] == [(8, 'error')]
+    assert 'left out' in ref.diagnostics[0].message
+    endpoint = ref.endpoints[0]
+    assert endpoint.global_query_parameters is None
+    assert [m.method for m in endpoint.methods] == ['GET']
+    assert [r.code for r in endpoint.methods[0].responses] == ['200 - OK', '401 - Unauthorized']
+    assert len(ref.endpoints) == 2
+
+# a table of another kind after the caption
+def test_wrong_table():
+    text = page.format(query=query_table.replace('| Parameter | Type | Description', '| HTTP code | Reponse body'), responses_end='|===')
+    with pytest.raises(adoc2xlsx.ParseError, match='^line 7: Global query parameters table: header'):
+        parse(text)
+    ref = parse(text, recover=True)
+    assert [(d.line, d.severity) for d in ref.diagnostics] == [(7, 'error')]
+    assert ref.endpoints[0].global_query_parameters is None
+
+# a table without its closing |=== in the middle of the page
+def test_unterminated_table():
+    text = page.format(query=query_table, responses_end='')
+    with pytest.raises(adoc2xlsx.ParseError, match='^line 22: HTTP responses table: no closing'):
+        parse(text)
+    ref = parse(text, recover=True)
+    assert [(d.line, d.severity) for d in ref.diagnostics] == [(22, 'error')]
+    assert ref.diagnostics[0].text.startswith('| HTTP code')
+    assert ref.endpoints[0].methods[0].responses is None
+    assert [e.path for e in ref.endpoints] == ['/api/v1/pods', '/api/v1/namespaces/{namespace}/pods/{name}']
+    assert [p.name for p in ref.endpoints[1].global_path_parameters] == ['name']
+
+# a table without its closing |=== at the end of the page
+def test_unterminated_last_table():
+    text = page.format(query=query_table, responses_end='|===').rsplit('|===', 1)[0]
+    with pytest.raises(adoc2xlsx.ParseError, match='Global path parameters table: no closing'):
+        parse(text)
+    ref = parse(text, recover=True)
+    assert [d.severity for d in ref.diagnostics] == ['error']
+    assert ref.endpoints[1].global_path_parameters is None